@@ -0,0 +1,270 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import threading
+import importlib
+import http.client
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+# --- Settings ---
+
+DEFAULT_HEADERS = {
+    # AntiBotNode rejects obvious clients, so look like a browser
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) WebNodeBench/1.0',
+    'Accept': 'text/html,*/*;q=0.8',
+    'Accept-Language': 'en',
+}
+CSRF_INPUT = re.compile(rb'name="csrf_token"\s+value="([^"]+)"')
+PERCENTILES = (('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9))
+
+# --- Request mix ---
+
+class RequestSpec:
+    """
+    One entry of the request mix, parsed from "[WEIGHT*]METHOD PATH [FORM_BODY]", e.g.
+        "GET /"
+        "3*GET /users"
+        "POST /add_user name=bench{n}&email=bench{n}@example.com"
+    {n} in the path or body is replaced by a number unique to the run, so inserts don't collide.
+    """
+    def __init__(self, spec):
+        weight, _, rest = spec.partition('*') if re.match(r'^\d+\*', spec) else ('1', '', spec)
+        parts = rest.split(None, 2)
+        if len(parts) < 2:
+            raise ValueError(f"Request must look like 'METHOD PATH [BODY]', got {spec!r}")
+        self.weight = int(weight)
+        self.method = parts[0].upper()
+        self.path = parts[1]
+        self.body = parts[2] if len(parts) > 2 else None
+        self.label = f"{self.method} {self.path}"
+
+    def render(self, n):
+        path = self.path.replace('{n}', str(n))
+        body = self.body.replace('{n}', str(n)) if self.body is not None else None
+        return path, body
+
+# --- Client ---
+
+class Worker(threading.Thread):
+    """One simulated client: a single connection (kept alive unless disabled) issuing requests back to back."""
+    def __init__(self, bench, index):
+        super().__init__(name=f"bench-{index}", daemon=True)
+        self.bench = bench
+        self.random = random.Random(bench.seed + index)
+        self.conn = None
+        self.cookies = {}
+        self.csrf_token = None
+        self.samples = [] # (label, status, seconds, bytes); status 0 = connection error
+        self.errors = []
+
+    def connection(self):
+        if self.conn is None:
+            bench = self.bench
+            self.conn = http.client.HTTPConnection(bench.host, bench.port, timeout=bench.timeout)
+        return self.conn
+
+    def reset(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def send(self, method, path, body=None):
+        headers = dict(self.bench.headers)
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if not self.bench.keepalive:
+            headers['Connection'] = 'close'
+
+        conn = self.connection()
+        conn.request(method, path, body=body.encode('utf-8') if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        for value in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(value).items():
+                self.cookies[name] = morsel.value
+        if not self.bench.keepalive or response.will_close:
+            self.reset()
+        return response.status, data
+
+    def refresh_csrf(self):
+        """Fetches a page with a CSRF form (not counted) and keeps its token for POSTs."""
+        status, data = self.send('GET', self.bench.csrf_from)
+        match = CSRF_INPUT.search(data)
+        self.csrf_token = match.group(1).decode('ascii') if match else None
+
+    def request(self, spec):
+        path, body = spec.render(self.bench.next_number())
+        started = time.perf_counter()
+        try:
+            if spec.method == 'POST' and self.bench.csrf_from:
+                if self.csrf_token is None:
+                    self.refresh_csrf()
+                    started = time.perf_counter() # the token fetch isn't part of the request
+                if self.csrf_token:
+                    body = f"{body}&csrf_token={self.csrf_token}" if body else f"csrf_token={self.csrf_token}"
+            status, data = self.send(spec.method, path, body)
+        except (OSError, http.client.HTTPException) as e:
+            self.reset()
+            self.errors.append(f"{type(e).__name__}: {e}")
+            return started, (spec.label, 0, time.perf_counter() - started, 0)
+        elapsed = time.perf_counter() - started
+        if status == 403 and spec.method == 'POST':
+            self.csrf_token = None # expired or rejected; fetch a new one next time
+        return started, (spec.label, status, elapsed, len(data))
+
+    def run(self):
+        bench = self.bench
+        while True:
+            started, sample = self.request(self.random.choices(bench.specs, bench.weights)[0])
+            if started >= bench.measure_from:
+                self.samples.append(sample)
+            if time.perf_counter() >= bench.deadline:
+                break
+        self.reset()
+
+# --- Benchmark ---
+
+class Bench:
+    def __init__(self, url, specs, concurrency=10, duration=10.0, warmup=1.0, keepalive=True,
+                 csrf_from=None, headers=None, timeout=30.0, seed=0):
+        target = urlsplit(url if '://' in url else f"http://{url}")
+        if target.scheme != 'http':
+            raise ValueError("Only http:// targets are supported")
+        self.url = f"http://{target.netloc}"
+        self.host = target.hostname
+        self.port = target.port or 80
+        self.specs = [RequestSpec(spec) for spec in specs]
+        self.weights = [spec.weight for spec in self.specs]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.keepalive = keepalive
+        self.csrf_from = csrf_from
+        self.headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        self.timeout = timeout
+        self.seed = seed
+        self.counter = iter(range(1, sys.maxsize)) # next() on a range iterator is atomic under the GIL
+
+    def next_number(self):
+        return next(self.counter)
+
+    def run(self):
+        now = time.perf_counter()
+        self.measure_from = now + self.warmup
+        self.deadline = self.measure_from + self.duration
+        workers = [Worker(self, index) for index in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Measured from the end of warmup to the last response
+        elapsed = max(time.perf_counter() - self.measure_from, 1e-9)
+        return self.summarize(workers, elapsed)
+
+    def summarize(self, workers, elapsed):
+        samples = [sample for worker in workers for sample in worker.samples]
+        errors = [error for worker in workers for error in worker.errors]
+        statuses, by_label = {}, {}
+        for label, status, seconds, size in samples:
+            key = str(status) if status else 'error'
+            statuses[key] = statuses.get(key, 0) + 1
+            by_label.setdefault(label, []).append(seconds)
+
+        return {
+            'target': self.url,
+            'concurrency': self.concurrency,
+            'keepalive': self.keepalive,
+            'duration_s': round(elapsed, 3),
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'bytes': sum(sample[3] for sample in samples),
+            'status': dict(sorted(statuses.items())),
+            'errors': sorted(set(errors))[:10],
+            'latency_ms': latency_summary([sample[2] for sample in samples]),
+            'by_request': {
+                label: dict(count=len(latencies), **latency_summary(latencies))
+                for label, latencies in by_label.items()
+            },
+        }
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_values) * p / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {}
+    summary = {'mean': sum(latencies) / len(latencies) * 1000, 'min': latencies[0] * 1000}
+    for name, p in PERCENTILES:
+        summary[name] = percentile(latencies, p) * 1000
+    summary['max'] = latencies[-1] * 1000
+    return {key: round(value, 3) for key, value in summary.items()}
+
+def format_report(result):
+    lines = [
+        f"Target:       {result['target']} ({result['concurrency']} clients, keep-alive {'on' if result['keepalive'] else 'off'})",
+        f"Requests:     {result['requests']} in {result['duration_s']}s",
+        f"Throughput:   {result['throughput_rps']} req/s",
+        f"Status:       {', '.join(f'{status}: {count}' for status, count in result['status'].items()) or '-'}",
+    ]
+    latency = result['latency_ms']
+    if latency:
+        lines.append("Latency (ms): " + '  '.join(f"{name} {latency[name]:.2f}" for name in ('mean', 'p50', 'p90', 'p99', 'p999', 'max')))
+    if len(result['by_request']) > 1:
+        for label, stats in result['by_request'].items():
+            lines.append(f"  {label:<30} {stats['count']:>8}  p50 {stats['p50']:.2f}  p99 {stats['p99']:.2f}")
+    for error in result['errors']:
+        lines.append(f"Error:        {error}")
+    if '429' in result['status']:
+        lines.append("Note:         429 responses come from RateLimitNode; raise SECURITY['RATE_LIMIT_MAX'] for load tests.")
+    return '\n'.join(lines)
+
+# --- In-process target ---
+
+def serve_in_process(app):
+    """
+    Imports "module:attribute" (default main:server_node) from the current directory and
+    serves it on an ephemeral localhost port in a background thread. Returns the URL.
+    """
+    module_name, _, attribute = app.partition(':')
+    sys.path.insert(0, '.')
+    module = importlib.import_module(module_name)
+    server_node = getattr(module, attribute or 'server_node')
+
+    import socketserver
+    from nodes.server_node import FrameworkHandler
+
+    class QuietHandler(FrameworkHandler):
+        def log_message(self, format, *args):
+            pass # per-request logging to stderr would dominate the measurement
+
+    QuietHandler.server_node = server_node
+
+    class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server(('127.0.0.1', 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_bench(url=None, app=None, output=None, as_json=False, **options):
+    """Runs a benchmark against url, or an in-process graph (app), prints the report and returns the result."""
+    if app:
+        url = serve_in_process(app)
+    result = Bench(url, **options).run()
+    print(json.dumps(result, indent=2) if as_json else format_report(result))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return result
@@ -2,6 +2,9 @@ import os
 import secrets
 import argparse
 import sys
+from webnode.collectstatic import collect_static
+from webnode.bench import run_bench
+from webnode.microbench import run_microbench, DEFAULT_THRESHOLD
 
 # --- Constants & Helpers ---
 
@@ -24,8 +27,16 @@ BASE_DIR = os.getcwd()
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATIC_BUILD_ROOT = os.path.join(BASE_DIR, 'static_build') # output of `node-web collectstatic`
+STATIC_MANIFEST = os.path.join(STATIC_BUILD_ROOT, 'manifest.json')
+STATIC_MAX_AGE = 86400 # Cache-Control max-age for static files (seconds)
+STATIC_MEMORY_CACHE_FILE_LIMIT = 64 * 1024 # files up to this size are served from memory
+STATIC_MEMORY_CACHE_SIZE = 16 * 1024 * 1024 # total bytes kept in the static memory cache
 
 PORT = 8000
+MAX_BODY_SIZE = 512 * 1024 * 1024 # larger request bodies are refused with 413 before being read
+PARALLEL_MAX_WORKERS = 8 # threads shared by all ParallelNodes
+PROCESS_POOL_WORKERS = None # worker processes for ProcessLogicNode (None = CPU count)
 
 # Security
 def get_secret_key():
@@ -49,8 +60,78 @@ SECURITY = {
     'RATE_LIMIT_MAX': 50, # requests per window
     'RATE_LIMIT_WINDOW': 60, # seconds
     'CSRF_ENABLED': True,
+    'CSRF_TOKEN_MAX_AGE': 3600, # seconds a signed token stays valid
+    'CSRF_SESSION_COOKIE': 'sessionid', # tokens are bound to this cookie when present
+    'CSRF_COOKIE': 'csrftoken', # signed cookie tokens are bound to when there is no session cookie
+    'CSRF_COOKIE_AGE': 365 * 24 * 3600, # seconds
+    'CSRF_COOKIE_SECURE': False, # True when served over HTTPS only
     'ANTI_SCRAPING_ENABLED': True, # User-Agent checks
-    'SCREEN_PROTECTION_ENABLED': True # Black screen on blur/printscreen
+    'SCREEN_PROTECTION_ENABLED': True, # Black screen on blur/printscreen
+    'IP_FILTER_ENABLED': True, # CIDR block/allow lists; also applied to static files
+    'IP_BLOCKLIST_FILE': os.path.join(BASE_DIR, 'core', 'ip_blocklist.txt'),
+    'IP_ALLOWLIST_FILE': os.path.join(BASE_DIR, 'core', 'ip_allowlist.txt'),
+    'IP_FILTER_RELOAD_INTERVAL': 5, # seconds between list file mtime checks
+}
+
+LOGGING = {
+    'ENABLED': True,
+}
+
+COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024, # bytes; smaller responses are sent as-is
+    'LEVEL': 6, # gzip/deflate level (1-9)
+    'CACHE_ENTRIES': 256, # compressed variants kept in memory
+    'CACHE_MAX_BODY': 1024 * 1024, # larger bodies are compressed but not cached
+}
+
+UPLOADS = {
+    'SPOOL_THRESHOLD': 1024 * 1024, # uploaded files larger than this are spooled to a temp file
+    'MAX_FIELD_SIZE': 1024 * 1024, # bytes per non-file multipart field
+    'MAX_PARTS': 1000, # fields + files per multipart body
+    'TEMP_DIR': None, # directory for spooled uploads (None = system temp dir)
+}
+
+METRICS = {
+    'ENABLED': True, # request/DB/cache counters and the metrics endpoint
+    'ENDPOINT': '/__metrics', # Prometheus text format, served before the graph
+    'ENDPOINT_ALLOWED': ['127.0.0.1', '::1'], # networks allowed to scrape; add your Prometheus host
+    'DIR': None, # set when running several server processes: each writes its metrics here, scrapes merge them
+    'FLUSH_INTERVAL': 5, # seconds between metric file writes (with DIR)
+    'NODE_TIMING': False, # time every node's process() (wall + CPU); see core.metrics.node_timer
+}
+
+TRACING = {
+    'ENABLED': False, # per-request span trees (nodes + database calls); see core.tracing
+    'SAMPLE_RATE': 0.01, # fraction of requests traced
+    'SLOW_THRESHOLD': None, # seconds; also keep every request at least this slow (records all requests)
+    'FILE': os.path.join(BASE_DIR, 'traces.jsonl'), # Chrome trace events, one per line
+}
+
+SLOW_QUERY_LOG = {
+    'ENABLED': True, # per-query-shape stats + slow query warnings on the 'webnode.db' logger; see core.query_log
+    'THRESHOLD': 0.1, # seconds; None = keep stats, never log
+    'PARAMS': 'redact', # 'show' values, 'redact' (type and length only) or 'hide'
+    'EXPLAIN': True, # attach EXPLAIN QUERY PLAN (once per query shape)
+    'MAX_SHAPES': 1000, # further distinct queries are counted as '<other>'
+}
+
+QUERY_AUDIT = {
+    'ENABLED': True, # EXPLAIN QUERY PLAN every ModelNode query at startup; see core.audit
+    'STRICT': False, # True = refuse to start when anything is flagged
+    # Accepted findings, as 'kind' or 'kind:subject' (e.g. 'temp_btree').
+    # The demo's /users page lists every user on purpose, so its full scan is accepted.
+    'IGNORE': ['full_scan:users'],
+}
+
+PROFILING = {
+    'ENABLED': False, # on-demand cProfile/tracemalloc captures; see core.profiling
+    'TOKEN': None, # secret that lets a request ask for a capture via HEADER (None = header ignored)
+    'HEADER': 'X-Webnode-Profile', # value: "<token>" or "<token>:cpu|memory|both"
+    'ROUTES': {}, # {'/users': 5} captures the next 5 requests to /users
+    'MODE': 'cpu', # default mode: 'cpu' (cProfile), 'memory' (tracemalloc) or 'both'
+    'TRACEMALLOC_FRAMES': 10, # stack depth kept per allocation
+    'DIR': os.path.join(BASE_DIR, 'profiles'),
 }
 """
 
@@ -73,6 +154,13 @@ class BaseNode:
         node.prev_node = self
         return node
 
+    def children(self):
+        \"\"\"
+        Nodes this node can pass data to, used to walk the graph (e.g. for instrumentation).
+        Nodes that branch (RouterNode, ParallelNode) add their branches.
+        \"\"\"
+        return [self.next_node] if self.next_node else []
+
     def process(self, data):
         \"\"\"
         Processes data and passes it to the next node.
@@ -87,9 +175,20 @@ SERVER_NODE_PY = """
 import http.server
 import sys
 import os
+import time
+import ipaddress
+import threading
 import importlib
 import settings
 from nodes.base_node import BaseNode
+from core.static_files import StaticFiles, StaticManifest
+from core.compression import ResponseCompressor
+from core.multipart import RequestBodyError
+from core.response import Response
+from core.metrics import node_timer, registry, graph_collector, database_hook, transaction_hook, walk
+from core.tracing import tracer
+from core.profiling import profiler
+from core.db import Database
 
 class ServerNode(BaseNode):
     \"\"\"
@@ -100,14 +199,73 @@ class ServerNode(BaseNode):
     def __init__(self, port=8000):
         super().__init__()
         self.port = port
+        self.instrumented = False
+        self.instrument_lock = threading.Lock()
+        self.screens = None # main-line nodes with check_connection(), found on first use
 
     def start_flow(self, handler):
         \"\"\"
         Triggered by FrameworkHandler.
         Passes the raw handler to the next node (HTTPRequestNode).
         \"\"\"
+        if not self.instrumented:
+            self.instrument()
         return self.process(handler)
 
+    def screen(self, handler):
+        \"\"\"
+        Runs the connection checks of the graph's main line (nodes with check_connection(),
+        such as IPFilterNode) for requests answered outside the graph, like static files.
+        Returns the Response to send instead, or None. Checks behind a URLNode only apply
+        to their own route.
+        \"\"\"
+        if self.screens is None:
+            self.screens = [
+                node for node, route, _ in walk(self)
+                if not route and node is not self and hasattr(node, 'check_connection')
+            ]
+        for node in self.screens:
+            response = node.check_connection(handler)
+            if response is not None:
+                return response
+        return None
+
+    def instrument(self):
+        \"\"\"
+        Hooks metrics into the graph as wired at the first request:
+        - per-node timing, if settings.METRICS['NODE_TIMING'] (otherwise nodes run unwrapped)
+        - node counters (cache hits, security rejections), database timings and, with
+          METRICS['DIR'], the snapshot file for multi-process aggregation
+        - node and database spans, if settings.TRACING['ENABLED']
+        \"\"\"
+        with self.instrument_lock:
+            if self.instrumented:
+                return
+            metrics = getattr(settings, 'METRICS', {})
+            if metrics.get('NODE_TIMING', False):
+                node_timer.instrument(self)
+            if metrics.get('ENABLED', True):
+                registry.collectors.append(graph_collector(self))
+                registry.collectors.append(compression_collector)
+                if database_hook not in Database.query_hooks:
+                    Database.query_hooks.append(database_hook)
+                if transaction_hook not in Database.transaction_hooks:
+                    Database.transaction_hooks.append(transaction_hook)
+                registry.start_flusher()
+            if getattr(settings, 'TRACING', {}).get('ENABLED', False):
+                tracer.instrument(self)
+                if tracer.database_hook not in Database.query_hooks:
+                    Database.query_hooks.append(tracer.database_hook)
+                if tracer.transaction_hook not in Database.transaction_hooks:
+                    Database.transaction_hooks.append(tracer.transaction_hook)
+            self.instrumented = True
+
+def compression_collector():
+    compressor = FrameworkHandler.compressor
+    labels = (('cache', 'compression'),)
+    yield 'counter', 'webnode_cache_hits_total', labels, compressor.hits
+    yield 'counter', 'webnode_cache_misses_total', labels, compressor.misses
+
 class FrameworkHandler(http.server.SimpleHTTPRequestHandler):
     \"\"\"
     The actual HTTP Handler that receives requests from socketserver.
@@ -116,32 +274,237 @@ class FrameworkHandler(http.server.SimpleHTTPRequestHandler):
     
     server_node = None
 
+    # HTTP/1.1 for keep-alive and chunked streaming; every response sets Content-Length,
+    # is chunked, or closes the connection.
+    protocol_version = 'HTTP/1.1'
+    timeout = 30 # seconds an idle keep-alive connection is held open
+    # Headers and body go out as separate writes; without this, Nagle + delayed ACK stall keep-alive responses ~40ms
+    disable_nagle_algorithm = True
+    body_read = True # reset per request by handle_request, set again by RequestWrapper
+
+    # Static fast path: matched before the graph, so assets skip the security chain
+    static_files = StaticFiles(
+        settings.STATIC_ROOT,
+        settings.STATIC_URL,
+        max_age=getattr(settings, 'STATIC_MAX_AGE', 86400),
+        file_limit=getattr(settings, 'STATIC_MEMORY_CACHE_FILE_LIMIT', 64 * 1024),
+        cache_size=getattr(settings, 'STATIC_MEMORY_CACHE_SIZE', 16 * 1024 * 1024),
+        build_root=getattr(settings, 'STATIC_BUILD_ROOT', None),
+        manifest=StaticManifest(getattr(settings, 'STATIC_MANIFEST', None), settings.STATIC_URL),
+    )
+
+    compression = getattr(settings, 'COMPRESSION', {})
+    compressor = ResponseCompressor(
+        min_size=compression.get('MIN_SIZE', 1024),
+        level=compression.get('LEVEL', 6),
+        cache_entries=compression.get('CACHE_ENTRIES', 256),
+        cache_max_body=compression.get('CACHE_MAX_BODY', 1024 * 1024),
+    )
+
+    metrics = getattr(settings, 'METRICS', {})
+    # Clients allowed to read the metrics endpoint (everyone else gets a 404)
+    metrics_allowed = [
+        ipaddress.ip_network(network, strict=False)
+        for network in metrics.get('ENDPOINT_ALLOWED', ('127.0.0.1', '::1'))
+    ]
+
+    def send_response(self, code, message=None):
+        self.status = code # recorded in the request metrics
+        super().send_response(code, message)
+
+    def handle_request(self, method):
+        \"\"\"
+        Every request starts here: metrics endpoint, then static files, then the graph.
+        Around that: request metrics, the trace root span and on-demand profiling.
+        \"\"\"
+        self.body_read = False # set by RequestWrapper once the whole body is consumed
+        try:
+            self.dispatch_request(method)
+        finally:
+            self.finish_body()
+
+    def body_pending(self):
+        \"\"\"True if the client sent a body that has not been read in full.\"\"\"
+        if self.body_read:
+            return False
+        return 'Transfer-Encoding' in self.headers or self.headers.get('Content-Length', '0').strip() != '0'
+
+    def finish_body(self):
+        \"\"\"
+        Closes the connection if the client sent a body that was not read in full (static
+        files, metrics, rejected or bodiless routes): on keep-alive the unread bytes would
+        be parsed as the next request.
+        \"\"\"
+        if self.body_pending():
+            self.close_connection = True
+
+    def end_headers(self):
+        # Announce the close finish_body() will do, so the client doesn't reuse the connection
+        if not self.close_connection and self.body_pending():
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def dispatch_request(self, method):
+        track = self.metrics.get('ENABLED', True)
+        if track and method != 'POST' and self.path.partition('?')[0] == self.metrics.get('ENDPOINT', '/__metrics'):
+            return self.send_metrics(method)
+
+        trace = None
+        if getattr(settings, 'TRACING', {}).get('ENABLED', False):
+            trace = tracer.begin(f"{method} {self.path.partition('?')[0]}", {'http.method': method, 'http.target': self.path})
+        capture = None
+        if getattr(settings, 'PROFILING', {}).get('ENABLED', False):
+            capture = profiler.begin(self)
+        if not track and trace is None and capture is None:
+            return self.route_request(method)
+
+        self.status = None
+        self.route = None
+        if track:
+            registry.add('webnode_requests_in_flight', 1)
+        started = time.perf_counter()
+        try:
+            self.route_request(method)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = self.route or 'unmatched'
+            if capture is not None:
+                profiler.end(capture, route)
+            # No status means the request failed before a response went out
+            status = str(self.status or 500)
+            if track:
+                registry.add('webnode_requests_in_flight', -1)
+                registry.inc('webnode_requests_total', (('route', route), ('method', method), ('status', status)))
+                registry.observe('webnode_request_duration_seconds', elapsed, (('route', route),))
+            if trace is not None:
+                tracer.end(trace, {'http.route': route, 'http.status_code': int(status)})
+
+    def route_request(self, method):
+        if method != 'POST' and self.static_files.matches(self.path):
+            self.route = 'static'
+            rejection = self.server_node.screen(self) if self.server_node else None
+            if rejection is not None:
+                return self.send_body(method, rejection)
+            return self.static_files.serve(self, head=(method == 'HEAD'))
+        return self.handle_graph_request(method)
+
+    def send_metrics(self, method):
+        try:
+            address = ipaddress.ip_address(self.client_address[0])
+        except ValueError:
+            address = None
+        if address is None or not any(address in network for network in self.metrics_allowed):
+            return self.send_error(404, "Page Not Found")
+
+        # Node counters are registered with the graph; make sure that happened even before any page request
+        if self.server_node and not self.server_node.instrumented:
+            self.server_node.instrument()
+        body = registry.render()
+        self.send_body(method, Response(body, content_type='text/plain; version=0.0.4; charset=utf-8'))
+
     def handle_graph_request(self, method):
         if self.server_node:
-            response_content = self.server_node.start_flow(self)
-            
-            if response_content:
-                 self.send_response(200)
-                 self.send_header('Content-type', 'text/html')
-                 self.end_headers()
-                 self.wfile.write(response_content.encode('utf-8'))
-            elif self.path.startswith(settings.STATIC_URL):
-                 super().do_GET()
-            else:
+            try:
+                response_content = self.server_node.start_flow(self)
+            except RequestBodyError as e:
+                # Oversized or malformed body: the rest of it is never read, so drop the connection
+                self.close_connection = True
+                self.send_error(e.status, str(e))
+                return
+
+            response = Response.coerce(response_content)
+            if response is None:
                  self.send_error(404, "Page Not Found")
+            elif Response.is_stream(response.body):
+                 self.send_stream(method, response)
+            else:
+                 self.send_body(method, response)
         else:
              self.send_error(500, "Server Node not configured")
 
+    def send_headers(self, response, extra_headers=()):
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        for name, value in extra_headers:
+            self.send_header(name, value)
+
+    def send_body(self, method, response):
+        body = response.encoded_body() if response.has_body else b''
+        extra_headers = []
+        if body and self.compression.get('ENABLED', True) and response.get_header('Content-Encoding') is None:
+            body, extra_headers = self.compressor.apply(self.headers, response.content_type, body)
+
+        self.send_headers(response, extra_headers)
+        if response.has_body:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method != 'HEAD' and body:
+            self.wfile.write(body)
+
+    def send_stream(self, method, response):
+        \"\"\"
+        Sends a response whose body is an iterable of str/bytes chunks as it is produced,
+        with chunked transfer encoding (HTTP/1.0 clients get the raw bytes and a closed connection).
+        Each chunk is written as soon as the iterator yields it.
+        \"\"\"
+        chunked = self.request_version != 'HTTP/1.0'
+        chunks = source = response.body
+        extra_headers = []
+        if self.compression.get('ENABLED', True) and response.get_header('Content-Encoding') is None:
+            chunks, extra_headers = self.compressor.stream(self.headers, response.content_type, chunks)
+
+        self.send_headers(response, extra_headers)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        try:
+            if method == 'HEAD':
+                return
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue # an empty chunk would end the response
+                if chunked:
+                    self.wfile.write(b'%X\\r\\n%b\\r\\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\\r\\n\\r\\n')
+        except Exception as e:
+            # Headers are already out: all we can do is cut the response short
+            self.close_connection = True
+            print(f"Streaming Error: {e}")
+        finally:
+            # Close the source too: a generator that never started ignores close()
+            for iterator in (chunks, source):
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
     def do_GET(self):
-        return self.handle_graph_request('GET')
+        return self.handle_request('GET')
+
+    def do_HEAD(self):
+        return self.handle_request('HEAD')
 
     def do_POST(self):
-        return self.handle_graph_request('POST')
+        return self.handle_request('POST')
 """
 
 HTTP_REQUESTS_NODE_PY = """
+import io
+import http.cookies
 import urllib.parse
+import settings
 from nodes.base_node import BaseNode
+from core.multipart import MultipartParser, RequestBodyError, RequestBodyTooLarge
+from core.response import Response
 
 class HTTPRequestsNode(BaseNode):
     \"\"\"
@@ -158,35 +521,262 @@ class HTTPRequestsNode(BaseNode):
         Passes a 'request' wrapper to the next node.
         \"\"\"
         request = RequestWrapper(handler)
-        return super().process(request)
+        try:
+            result = super().process(request)
+        except BaseException:
+            request.close()
+            raise
+        finally:
+            handler.route = request.route
+        # Streamed responses keep the request open until the last chunk is sent
+        if isinstance(result, Response):
+            if Response.is_stream(result.body):
+                result.body = ClosingStream(result.body, request)
+                return result
+        elif Response.is_stream(result):
+            return ClosingStream(result, request)
+        request.close()
+        return result
+
+class ClosingStream:
+    \"\"\"
+    Iterates a streamed response and closes its request once the stream is
+    exhausted or closed early (client gone, HEAD request).
+    \"\"\"
+    __slots__ = ('chunks', 'request')
+
+    def __init__(self, chunks, request):
+        self.chunks = iter(chunks)
+        self.request = request
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self.request is not None:
+            request, self.request = self.request, None
+            try:
+                close = getattr(self.chunks, 'close', None)
+                if close is not None:
+                    close()
+            finally:
+                request.close()
 
 class RequestWrapper:
     \"\"\"
     Simple wrapper to mimic the previous request object interface.
+    The body, form params, query params and cookies are parsed lazily on first access
+    and cached, so requests rejected early (rate limit, bots) never pay for parsing.
+
+    The body can be read whole (body_bytes) or streamed (iter_body, readinto).
+    multipart/form-data bodies are streamed through MultipartParser: fields land in
+    params, files in `files` as UploadedFile objects spooled to temp files.
+    Bodies over settings.MAX_BODY_SIZE raise RequestBodyTooLarge before anything is read.
+
+    - full_path: the request target as sent ('/search?q=node').
+    - path: the decoded path without the query string ('/search'); used for routing and cache keys.
+    - query_string: the raw query string ('q=node').
     \"\"\"
+    __slots__ = ('handler', 'full_path', 'path', 'route', 'query_string', 'headers', 'method', 'context',
+                 'screen_protection', '_body', '_remaining', '_params', '_files', '_query', '_cookies')
+
     def __init__(self, handler):
         self.handler = handler
-        self.path = handler.path
+        self.full_path = handler.path
+        path, _, self.query_string = handler.path.partition('?')
+        self.path = urllib.parse.unquote(path.partition('#')[0])
+        self.route = None # path of the URLNode that matched, set by URLNode
         self.headers = handler.headers
         self.method = handler.command
-        self.params = {}
         self.context = {}
-        self.body_bytes = b""
-        
-        if self.method == 'POST':
+        self.screen_protection = None # set by ScreenProtectionNode, consumed by RenderNode
+        self._body = None
+        self._remaining = None # body bytes not yet read from the socket
+        self._params = None
+        self._files = None
+        self._query = None
+        self._cookies = None
+
+    @property
+    def content_length(self):
+        \"\"\"Declared body size in bytes (0 when absent). Raises RequestBodyTooLarge past MAX_BODY_SIZE.\"\"\"
+        if self.method != 'POST':
+            return 0
+        try:
+            length = max(int(self.headers.get('Content-Length', 0)), 0)
+        except ValueError:
+            return 0
+        limit = getattr(settings, 'MAX_BODY_SIZE', None)
+        if limit is not None and length > limit:
+            raise RequestBodyTooLarge(f"Request body of {length} bytes exceeds the {limit} byte limit")
+        return length
+
+    def readinto(self, buffer):
+        \"\"\"
+        Reads the next part of the body into a writable buffer (bytearray, memoryview).
+        Returns the number of bytes read; 0 once the body is exhausted.
+        \"\"\"
+        if self._remaining is None:
+            if self._body is not None:
+                raise RuntimeError("Request body was already read into memory; use body_bytes")
+            self._remaining = self.content_length
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        with memoryview(buffer) as view:
+            n = self.handler.rfile.readinto(view[:size])
+        if not n:
+            raise RequestBodyError("Client closed the connection before sending the whole body")
+        self._remaining -= n
+        if not self._remaining:
+            self.handler.body_read = True
+        return n
+
+    def iter_body(self, chunk_size=64 * 1024):
+        \"\"\"
+        Yields the body in chunks without holding all of it in memory.
+        The chunks are views of one reusable buffer: use or copy each before the next.
+        \"\"\"
+        if self._body is not None:
+            if self._body:
+                yield memoryview(self._body)
+            return
+        buffer = bytearray(chunk_size)
+        with memoryview(buffer) as view:
+            while True:
+                n = self.readinto(view)
+                if not n:
+                    break
+                yield view[:n]
+
+    @property
+    def body_bytes(self):
+        \"\"\"The whole body in memory. For large bodies prefer iter_body() or readinto().\"\"\"
+        if self._body is None:
+            if self._remaining is not None:
+                raise RuntimeError("Request body was already streamed")
+            length = self.content_length
+            self._body = self.handler.rfile.read(length) if length else b""
+            if length and len(self._body) == length:
+                self.handler.body_read = True
+        return self._body
+
+    @property
+    def is_multipart(self):
+        return MultipartParser.boundary(self.headers.get('Content-Type')) is not None
+
+    @property
+    def params(self):
+        if self._params is None:
             self.parse_body()
+        return self._params
+
+    @property
+    def files(self):
+        \"\"\"Uploaded files of a multipart/form-data body as {field name: [UploadedFile]}.\"\"\"
+        if self._params is None:
+            self.parse_body()
+        return self._files
+
+    @property
+    def query(self):
+        \"\"\"Query string params, in the same {key: [values]} form as params.\"\"\"
+        if self._query is None:
+            self._query = urllib.parse.parse_qs(self.query_string.partition('#')[0]) if self.query_string else {}
+        return self._query
+
+    @property
+    def cookies(self):
+        \"\"\"Request cookies as a {name: value} dict.\"\"\"
+        if self._cookies is None:
+            cookies = {}
+            cookie_header = self.headers.get('Cookie')
+            if cookie_header:
+                jar = http.cookies.SimpleCookie()
+                try:
+                    jar.load(cookie_header)
+                except http.cookies.CookieError:
+                    pass
+                cookies = {name: morsel.value for name, morsel in jar.items()}
+            self._cookies = cookies
+        return self._cookies
 
     def parse_body(self):
-        if 'Content-Length' in self.headers:
-            content_length = int(self.headers['Content-Length'])
-            self.body_bytes = self.handler.rfile.read(content_length)
-            decoded_body = self.body_bytes.decode('utf-8')
-            self.params = urllib.parse.parse_qs(decoded_body)
-
-    def get_param(self, key, default=None):
-        val_list = self.params.get(key)
-        if val_list:
-            return val_list[0]
+        self._files = {}
+        boundary = MultipartParser.boundary(self.headers.get('Content-Type'))
+        if boundary is not None:
+            if self._body is not None:
+                readinto = io.BytesIO(self._body).readinto
+            elif self._remaining is None:
+                readinto = self.readinto
+            else:
+                raise RuntimeError("Request body was already streamed")
+            uploads = getattr(settings, 'UPLOADS', {})
+            parser = MultipartParser(
+                readinto,
+                boundary,
+                spool_threshold=uploads.get('SPOOL_THRESHOLD', 1024 * 1024),
+                max_field_size=uploads.get('MAX_FIELD_SIZE', 1024 * 1024),
+                max_parts=uploads.get('MAX_PARTS', 1000),
+                temp_dir=uploads.get('TEMP_DIR'),
+            )
+            self._params, self._files = parser.parse()
+            return
+
+        body = self.body_bytes
+        if body:
+            decoded_body = body.decode('utf-8', errors='replace')
+            self._params = urllib.parse.parse_qs(decoded_body)
+        else:
+            self._params = {}
+
+    def close(self):
+        \"\"\"
+        Releases uploaded files (and their temp files) once the request is done.
+        A body left unread closes the connection (FrameworkHandler.finish_body).
+        \"\"\"
+        if self._files:
+            for uploads in self._files.values():
+                for upload in uploads:
+                    upload.close()
+
+    def copy(self):
+        \"\"\"
+        Shallow copy with its own context dict, for work that runs outside
+        the request's own flow (background refreshes, parallel branches).
+        The body is read (or, for multipart, parsed) first, so the original and the copy share it.
+        \"\"\"
+        if self._remaining is None and self._body is None:
+            if self.is_multipart:
+                self.params
+            else:
+                self.body_bytes
+        clone = RequestWrapper.__new__(RequestWrapper)
+        for name in RequestWrapper.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.context = dict(self.context)
+        return clone
+
+    def get_param(self, key, default=None, source='both'):
+        \"\"\"
+        Returns the first value of a request parameter.
+        source: 'form' (POST body), 'query' (URL query string) or 'both' (form first, then query).
+        \"\"\"
+        if source in ('form', 'both'):
+            val_list = self.params.get(key)
+            if val_list:
+                return val_list[0]
+        if source in ('query', 'both'):
+            val_list = self.query.get(key)
+            if val_list:
+                return val_list[0]
         return default
 """
 
@@ -216,8 +806,12 @@ class ContextNode(BaseNode):
 
 LOGIC_NODE_PY = """
 from nodes.base_node import BaseNode
+from core.cache import LRUCache
+from core.singleflight import SingleFlight
 import sys
 
+MISSING = object()
+
 class LogicNode(BaseNode):
     \"\"\"
     Executes a callable logic function.
@@ -238,21 +832,80 @@ class LogicNode(BaseNode):
              request.context.update(result)
         
         return super().process(request)
+
+class MemoizedLogicNode(LogicNode):
+    \"\"\"
+    LogicNode that reuses its function's result instead of calling it on every request.
+    - key_func(request): returns the cache key. Without one, a single result is shared by
+      all requests. If it returns None, that request bypasses the cache.
+    - ttl: seconds a result is reused (None = until evicted).
+    - max_entries: LRU bound on stored results.
+    - hits / misses: counters.
+    When an entry is missing, concurrent requests for the same key wait for a single call.
+    \"\"\"
+    def __init__(self, logic_func, key_func=None, ttl=None, max_entries=128, coalesce_timeout=10):
+        super().__init__(logic_func)
+        self.key_func = key_func
+        self.ttl = ttl
+        self.cache = LRUCache(max_entries)
+        self.flight = SingleFlight(timeout=coalesce_timeout)
+        self.hits = 0
+        self.misses = 0
+
+    def process(self, request):
+        key = self.key_func(request) if self.key_func else ()
+        if key is None:
+            return super().process(request)
+
+        result = self.cache.get(key, MISSING)
+        if result is MISSING:
+            self.misses += 1
+            result = self.flight.do(key, lambda: self.compute(key, request))
+        else:
+            self.hits += 1
+
+        if isinstance(result, dict):
+             request.context.update(result)
+
+        return BaseNode.process(self, request)
+
+    def compute(self, key, request):
+        result = self.logic_func(request)
+        # Store a copy so later changes to the returned dict don't leak into the cache
+        self.cache.set(key, dict(result) if isinstance(result, dict) else result, self.ttl)
+        return result
 """
 
 TEMPLATE_NODE_PY = """
 import os
+import re
 import sys
+from collections.abc import Iterator
 import settings
 from nodes.base_node import BaseNode
+from core.static_files import StaticManifest
 
 class RenderNode(BaseNode):
     \"\"\"
     Handles template rendering (The 'Face' of the application).
     \"\"\"
-    def __init__(self, template_name):
+    # {(template_path, injected_snippet): (mtime, manifest_version, content)}
+    _compiled = {}
+    # {(template_name, injected_snippet): (content, [text, name, text, ..., text])}
+    _segments = {}
+    PLACEHOLDER = re.compile(r'\\{(\\w+)\\}')
+    # Asset URLs are rewritten to the fingerprinted names from `node-web collectstatic`
+    manifest = StaticManifest(getattr(settings, 'STATIC_MANIFEST', None), settings.STATIC_URL)
+
+    def __init__(self, template_name, screen_protection=True, stream=False):
+        \"\"\"
+        screen_protection: set to False to opt this route out of ScreenProtectionNode.
+        stream: return the page as a generator of chunks (see render_stream) instead of one string.
+        \"\"\"
         super().__init__()
         self.template_name = template_name
+        self.screen_protection = screen_protection
+        self.stream = stream
 
     PYSCRIPT_HEADER = '''
     <link rel="stylesheet" href="https://pyscript.net/releases/2024.1.1/core.css" />
@@ -264,36 +917,141 @@ class RenderNode(BaseNode):
         Receives request from the previous node, uses request.context, renders template, and returns HTML.
         \"\"\"
         context = getattr(request, 'context', request if isinstance(request, dict) else {})
-        return self.render(self.template_name, context)
+
+        # ScreenProtectionNode leaves its snippet on the request; taking it here
+        # marks it as handled so the node doesn't scan the rendered HTML again.
+        inject = getattr(request, 'screen_protection', None)
+        if inject is not None:
+            request.screen_protection = None
+            if not self.screen_protection:
+                inject = None
+
+        if self.stream:
+            return self.render_stream(self.template_name, context, inject=inject)
+        return self.render(self.template_name, context, inject=inject)
+
+    @staticmethod
+    def compile(template_name, inject=None):
+        \"\"\"
+        Loads a template once and caches it, with `inject` placed before </body>
+        and static asset URLs pointed at their fingerprinted names.
+        The file is re-read only when it or the static manifest changes.
+        Returns None if the template does not exist.
+        \"\"\"
+        template_path = os.path.join(settings.TEMPLATES_DIR, template_name)
+        key = (template_path, inject)
+
+        try:
+            mtime = os.stat(template_path).st_mtime_ns
+        except OSError:
+            return None
+
+        manifest = RenderNode.manifest
+        manifest.refresh()
+
+        cached = RenderNode._compiled.get(key)
+        if cached is not None and cached[0] == mtime and cached[1] == manifest.version:
+            return cached[2]
+
+        try:
+            with open(template_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+
+        if inject:
+            index = content.rfind("</body>")
+            if index != -1:
+                content = content[:index] + inject + content[index:]
+
+        content = manifest.rewrite(content)
+
+        RenderNode._compiled[key] = (mtime, manifest.version, content)
+        return content
 
     @staticmethod
-    def render(template_name, context=None):
+    def render(template_name, context=None, inject=None):
         \"\"\"
         Reads an HTML file from settings.TEMPLATES_DIR, replaces placeholders, and returns content.
         \"\"\"
         if context is None:
             context = {}
-        
+
         if not isinstance(context, dict):
              if context is None: context = {}
              else: context = {'data': context}
 
         context['pyscript_header'] = RenderNode.PYSCRIPT_HEADER
 
-        template_path = os.path.join(settings.TEMPLATES_DIR, template_name)
-        
-        try:
-            with open(template_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+        content = RenderNode.compile(template_name, inject)
+        if content is None:
+            return f"<h1>Template {template_name} not found</h1>"
 
-            for key, value in context.items():
-                if isinstance(value, str):
-                    content = content.replace(f"{{{key}}}", value)
-            
-            return content
-            
-        except FileNotFoundError:
+        for key, value in context.items():
+            if isinstance(value, str):
+                content = content.replace(f"{{{key}}}", value)
+
+        return content
+
+    @staticmethod
+    def segments(template_name, inject=None):
+        \"\"\"
+        The compiled template split at its {placeholders}: [text, name, text, ..., text].
+        Cached alongside the compiled template. Returns None if the template does not exist.
+        \"\"\"
+        content = RenderNode.compile(template_name, inject)
+        if content is None:
+            return None
+
+        key = (template_name, inject)
+        cached = RenderNode._segments.get(key)
+        if cached is not None and cached[0] is content:
+            return cached[1]
+
+        parts = RenderNode.PLACEHOLDER.split(content)
+        RenderNode._segments[key] = (content, parts)
+        return parts
+
+    @staticmethod
+    def render_stream(template_name, context=None, inject=None):
+        \"\"\"
+        Streaming render: returns a generator of HTML chunks.
+        Template text and str values are sent together; a context value that is an
+        iterator (a generator, rows from ModelNode(stream=True), ...) is sent chunk by
+        chunk as it produces them, so the top of the page goes out before slow data is ready.
+        \"\"\"
+        if context is None:
+            context = {}
+
+        if not isinstance(context, dict):
+            context = {'data': context}
+
+        context['pyscript_header'] = RenderNode.PYSCRIPT_HEADER
+
+        parts = RenderNode.segments(template_name, inject)
+        if parts is None:
             return f"<h1>Template {template_name} not found</h1>"
+
+        return RenderNode._stream(parts, context)
+
+    @staticmethod
+    def _stream(parts, context):
+        pending = [parts[0]]
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            value = context.get(name)
+            if isinstance(value, str):
+                pending.append(value)
+            elif isinstance(value, Iterator):
+                yield ''.join(pending)
+                pending = []
+                for chunk in value:
+                    if chunk:
+                        yield chunk
+            else:
+                pending.append(f"{{{name}}}") # unknown placeholders are left as-is, like render()
+            pending.append(parts[index + 1])
+        yield ''.join(pending)
 """
 
 URL_NODE_PY = """
@@ -315,225 +1073,2768 @@ class URLNode(BaseNode):
         If no match: Returns None.
         \"\"\"
         if self.path == request.path:
+            request.route = self.path # labels metrics and traces with the route, not the raw URL
             return super().process(request)
         return None
 """
 
 ROUTE_NODE_PY = """
+from heapq import merge
 from nodes.base_node import BaseNode
+from nodes.url_node import URLNode
 
 class RouterNode(BaseNode):
     \"\"\"
     Router Node that manages multiple route branches.
     It iterates through a list of route chains and executes the first one that matches.
+    URLNode routes are indexed by path, so only branches whose path equals request.path
+    (plus any non-URLNode routes) are tried, in their original order.
+    Appending routes is picked up automatically; call build_index() after replacing
+    routes in place.
     \"\"\"
     def __init__(self, routes):
         super().__init__()
         self.routes = routes
+        self._index = None # {path: [route positions]}
+        self._unindexed = [] # positions of routes that aren't URLNodes
+        self._indexed = (None, 0) # (routes list, length) the index was built from
+
+    def children(self):
+        return list(self.routes) + super().children()
+
+    def build_index(self):
+        index, unindexed = {}, []
+        for position, route in enumerate(self.routes):
+            if type(route) is URLNode:
+                index.setdefault(route.path, []).append(position)
+            else:
+                unindexed.append(position)
+        self._index, self._unindexed = index, unindexed
+        self._indexed = (self.routes, len(self.routes))
 
     def process(self, request):
-        for route in self.routes:
+        # Rebuild if the routes list was changed after construction
+        if self._indexed[0] is not self.routes or self._indexed[1] != len(self.routes):
+            self.build_index()
+
+        positions = self._index.get(request.path, ())
+        if self._unindexed:
+            positions = merge(positions, self._unindexed)
+
+        for position in positions:
             # route is expected to be a URLNode (start of a chain)
-            result = route.process(request)
+            result = self.routes[position].process(request)
             if result is not None:
                 return result
         return None
 """
 
-DB_PY = """
-import sqlite3
-import os
+DB_PY = """
+import sqlite3
+import os
+import time
+import settings
+from contextlib import contextmanager
+from core.query_log import query_log, logger
+
+class ObservedConnection(sqlite3.Connection):
+    \"\"\"The connection handed out by Database.transaction(): times each statement run on it.\"\"\"
+    database = None # set once the connection is set up
+
+    def execute(self, query, params=()):
+        started = time.perf_counter()
+        rows = None
+        try:
+            cursor = super().execute(query, params)
+            rows = cursor.rowcount
+            return cursor
+        finally:
+            if self.database is not None:
+                self.database.observe('execute', query, params, time.perf_counter() - started, rows)
+
+    def executemany(self, query, params_list):
+        started = time.perf_counter()
+        rows = None
+        try:
+            cursor = super().executemany(query, params_list)
+            rows = cursor.rowcount
+            return cursor
+        finally:
+            if self.database is not None:
+                self.database.observe('executemany', query, params_list, time.perf_counter() - started, rows)
+
+class Database:
+    _instance = None
+    # Called as hook(operation, query, params, seconds) after every query (see core.metrics)
+    query_hooks = []
+    # Called as hook(seconds, committed) after every transaction(); its statements go to query_hooks
+    transaction_hooks = []
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Database, cls).__new__(cls)
+            cls._instance.db_path = os.path.join(settings.BASE_DIR, 'db.sqlite3')
+            cls._instance.conn = None 
+        return cls._instance
+
+    def get_connection(self, factory=sqlite3.Connection):
+        \"\"\"Returns a new connection. 
+        Note: For transactions, we should usually reuse a connection or manage it carefully.
+        Here we return a fresh one for general use, but the transaction manager handles its own.\"\"\"
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=factory)
+        conn.execute("PRAGMA foreign_keys = ON;") # Enable Foreign Keys
+        return conn
+
+    def observe(self, operation, query, params, seconds, rows=None):
+        \"\"\"Reports a finished query to the query hooks and the slow query log (core.query_log).\"\"\"
+        for hook in self.query_hooks:
+            try:
+                hook(operation, query, params, seconds)
+            except Exception as e:
+                logger.error("Database Hook Error: %s", e)
+        if query_log.enabled:
+            try:
+                query_log.record(self, operation, query, params, seconds, rows)
+            except Exception:
+                logger.exception("Query log error")
+
+    def execute(self, query, params=()):
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        # self._register_default_functions(conn) # Register standard 'stored procs'
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        rows = None
+        try:
+            cursor.execute(query, params)
+            conn.commit()
+            rows = cursor.rowcount
+            return cursor
+        except Exception as e:
+            logger.error("Database Error: %s\\n  %s", e, query.strip())
+            raise e
+        finally:
+            conn.close()
+            self.observe('execute', query, params, time.perf_counter() - started, rows)
+
+    def executemany(self, query, params_list):
+        \"\"\"Bulk insert/update optimization.\"\"\"
+        conn = self.get_connection()
+        started = time.perf_counter()
+        rows = None
+        try:
+            with conn:
+                rows = conn.executemany(query, params_list).rowcount
+        except Exception as e:
+            logger.error("Database Error (Bulk): %s\\n  %s", e, query.strip())
+            raise e
+        finally:
+            conn.close()
+            self.observe('executemany', query, params_list, time.perf_counter() - started, rows)
+
+    def executescript(self, script):
+        \"\"\"Run a raw SQL script (good for migrations/triggers).\"\"\"
+        conn = self.get_connection()
+        started = time.perf_counter()
+        try:
+            with conn:
+                conn.executescript(script)
+        except Exception as e:
+            logger.error("Database Error (Script): %s", e)
+            raise e
+        finally:
+            conn.close()
+            self.observe('executescript', script, (), time.perf_counter() - started)
+
+    def fetchall(self, query, params=()):
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        # self._register_default_functions(conn)
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        rows = []
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error("Database Error: %s\\n  %s", e, query.strip())
+            return []
+        finally:
+            conn.close()
+            self.observe('fetchall', query, params, time.perf_counter() - started, len(rows))
+
+    def iterate(self, query, params=(), batch_size=500):
+        \"\"\"
+        Yields rows as dicts, fetching batch_size rows at a time, so large result sets
+        never sit in memory whole. The connection stays open until the generator is
+        exhausted or closed.
+        \"\"\"
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        elapsed = 0.0 # time spent in the database, not in the consumer between batches
+        count = 0
+        try:
+            started = time.perf_counter()
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - started
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield dict(row)
+                started = time.perf_counter()
+        except Exception as e:
+            logger.error("Database Error: %s\\n  %s", e, query.strip())
+        finally:
+            conn.close()
+            self.observe('iterate', query, params, elapsed, count)
+            
+    # --- "PL/SQL" Features (Stored Procedures / Functions) ---
+    def register_function(self, conn, name, num_params, func):
+        \"\"\"
+        Registers a Python function as a SQL function (Stored Procedure).
+        Usage in SQL: SELECT my_func(col) FROM table...
+        \"\"\"
+        conn.create_function(name, num_params, func)
+
+    @contextmanager
+    def transaction(self):
+        \"\"\"
+        Transaction Context Manager.
+        Usage:
+            with db.transaction() as conn:
+                db.execute_on_conn(conn, q1)
+                db.execute_on_conn(conn, q2)
+        Statements run with conn.execute()/executemany() are timed one by one as queries;
+        the transaction as a whole goes to transaction_hooks, not counted as a query.
+        \"\"\"
+        conn = self.get_connection(factory=ObservedConnection)
+        conn.database = self
+        started = time.perf_counter()
+        committed = False
+        try:
+            yield conn
+            conn.commit()
+            committed = True
+        except Exception as e:
+            conn.rollback()
+            logger.error("Transaction Rolled Back: %s", e)
+            raise e
+        finally:
+            conn.close()
+            seconds = time.perf_counter() - started
+            for hook in self.transaction_hooks:
+                try:
+                    hook(seconds, committed)
+                except Exception as e:
+                    logger.error("Database Hook Error: %s", e)
+
+    def setup_tables(self):
+        # 1. Base Tables (Users)
+        create_schema = '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_premium BOOLEAN DEFAULT 0
+        );
+        '''
+        self.executescript(create_schema)
+
+        # 2. Triggers
+        create_trigger = '''
+        CREATE TRIGGER IF NOT EXISTS validate_email_suffix
+        BEFORE INSERT ON users
+        BEGIN
+            SELECT
+            CASE
+                WHEN NEW.email NOT LIKE '%@%' THEN
+                RAISE (ABORT, 'Invalid email address')
+            END;
+        END;
+        '''
+        self.executescript(create_trigger)
+
+    # --- DDL & Schema Management ---
+
+    def create_table(self, table_name, columns_def):
+        \"\"\"
+        Creates a table with given columns definition.
+        columns_def: str, e.g., "id INTEGER PRIMARY KEY, name TEXT"
+        \"\"\"
+        query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_def});"
+        self.execute(query)
+
+    def alter_table(self, table_name, operation, details):
+        \"\"\"
+        Alters a table.
+        operation: 'ADD', 'RENAME', 'DROP' (Drop col not fully supported in old sqlite)
+        details: e.g., "COLUMN new_col TEXT"
+        \"\"\"
+        if operation.upper() == 'ADD':
+            query = f"ALTER TABLE {table_name} ADD {details};"
+        elif operation.upper() == 'RENAME':
+             query = f"ALTER TABLE {table_name} RENAME TO {details};"
+        else:
+            raise ValueError(f"Unsupported ALTER operation: {operation}")
+        self.execute(query)
+
+    def drop_table(self, table_name):
+        \"\"\"Drops a table if it exists.\"\"\"
+        query = f"DROP TABLE IF EXISTS {table_name};"
+        self.execute(query)
+
+    def create_view(self, view_name, select_query):
+        \"\"\"Creates a view.\"\"\"
+        query = f"CREATE VIEW IF NOT EXISTS {view_name} AS {select_query};"
+        self.execute(query)
+
+    def drop_view(self, view_name):
+        \"\"\"Drops a view.\"\"\"
+        query = f"DROP VIEW IF EXISTS {view_name};"
+        self.execute(query)
+
+    def create_index(self, index_name, table_name, columns, unique=False):
+        \"\"\"Creates an index.\"\"\"
+        unique_clause = "UNIQUE" if unique else ""
+        query = f"CREATE {unique_clause} INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns});"
+        self.execute(query)
+"""
+
+STATIC_FILES_PY = """
+import os
+import re
+import json
+import stat
+import time
+import secrets
+import mimetypes
+import threading
+import email.utils
+import urllib.parse
+from collections import OrderedDict
+from core.compression import ResponseCompressor
+
+class StaticManifest:
+    \"\"\"
+    The manifest.json written by `node-web collectstatic`: {original path: fingerprinted path}.
+    The file is checked for changes at most once per second and swapped in whole.
+    \"\"\"
+    def __init__(self, path, url_prefix):
+        self.path = path
+        self.url_prefix = url_prefix
+        self.pattern = re.compile(re.escape(url_prefix) + r'([^"\\'\\s?#()<>]+)')
+        self.version = None # manifest mtime, None when there is no manifest
+        self.state = ({}, frozenset()) # (files, fingerprinted names)
+        self._next_check = 0
+
+    def refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + 1
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            mtime = None
+        if mtime == self.version:
+            return
+
+        files = {}
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    files = json.load(f).get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"Static Manifest Error: {e}")
+                return
+
+        self.state = (files, frozenset(files.values()))
+        self.version = mtime
+
+    def is_fingerprinted(self, relative_path):
+        self.refresh()
+        return relative_path in self.state[1]
+
+    def rewrite(self, html):
+        \"\"\"Points STATIC_URL references to collected files at their fingerprinted names.\"\"\"
+        self.refresh()
+        files = self.state[0]
+        if not files:
+            return html
+
+        def replace(match):
+            hashed = files.get(match.group(1))
+            return self.url_prefix + hashed if hashed else match.group(0)
+        return self.pattern.sub(replace, html)
+
+class StaticFile:
+    \"\"\"
+    Metadata (and, for small files, the bytes) of one file under STATIC_ROOT.
+    \"\"\"
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'last_modified', 'content_type', 'data')
+
+    def __init__(self, path, st):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.data = None
+
+class StaticFiles:
+    \"\"\"
+    Serves files under url_prefix from root, before the node graph runs.
+    - build_root (the `node-web collectstatic` output) is searched first, then root.
+    - Validators: ETag and Last-Modified, answering 304 Not Modified when they match.
+    - Cache-Control: public, max-age=<max_age>.
+    - Small files (<= file_limit bytes) are kept in an LRU memory cache bounded by cache_size.
+    - Larger files go from the page cache to the socket with sendfile(), never through Python buffers.
+    - Range requests: 206 Partial Content (single or multipart/byteranges), If-Range, 416.
+    - HEAD: the same headers as GET, without a body.
+    - Fingerprinted files from the manifest are cached for a year as immutable.
+    - A precompressed '<file>.gz' sibling is sent instead of the file when the client accepts gzip.
+    \"\"\"
+    MAX_RANGES = 16 # more ranges than this in one request is ignored (full 200 response)
+    # App code lives in static/ too (static/logic.py); like collectstatic, never serve it
+    DENIED_EXTENSIONS = ('.py', '.pyc', '.pyo')
+    DENIED_DIRS = {'__pycache__'}
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    def __init__(self, root, url_prefix, max_age=86400, file_limit=64 * 1024, cache_size=16 * 1024 * 1024,
+                 build_root=None, manifest=None):
+        self.roots = [os.path.realpath(r) for r in (build_root, root) if r]
+        self.url_prefix = url_prefix
+        self.manifest = manifest
+        self.max_age = max_age
+        self.file_limit = file_limit
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # {fs_path: StaticFile}
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+    def matches(self, url_path):
+        return url_path.startswith(self.url_prefix)
+
+    def relative_path(self, url_path):
+        \"\"\"The decoded path below url_prefix, without query string.\"\"\"
+        path = urllib.parse.urlsplit(url_path).path
+        return urllib.parse.unquote(path[len(self.url_prefix):]).lstrip('/')
+
+    def is_denied(self, relative_path):
+        \"\"\"Python sources, bytecode, __pycache__ and hidden files are never served.\"\"\"
+        parts = relative_path.split(os.sep)
+        if any(part in self.DENIED_DIRS or part.startswith('.') for part in parts):
+            return True
+        return parts[-1].lower().endswith(self.DENIED_EXTENSIONS)
+
+    def lookup(self, relative_path):
+        \"\"\"Returns a fresh StaticFile for the first root holding the path, or None.\"\"\"
+        for root in self.roots:
+            full_path = os.path.realpath(os.path.join(root, relative_path))
+            if full_path != root and not full_path.startswith(root + os.sep):
+                return None # escapes the root
+            if full_path != root and self.is_denied(os.path.relpath(full_path, root)):
+                return None
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                return self.cached_entry(full_path, st)
+        return None
+
+    def cached_entry(self, full_path, st):
+
+        with self.lock:
+            entry = self.cache.get(full_path)
+            if entry is not None:
+                if entry.mtime == st.st_mtime_ns and entry.size == st.st_size:
+                    self.cache.move_to_end(full_path)
+                    return entry
+                # Changed on disk
+                del self.cache[full_path]
+                self.cached_bytes -= entry.size
+
+        entry = StaticFile(full_path, st)
+        if entry.size <= self.file_limit:
+            self.remember(entry)
+        return entry
+
+    def remember(self, entry):
+        try:
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) != entry.size:
+            return # file is being rewritten; don't cache a torn read
+        entry.data = data
+
+        with self.lock:
+            if entry.path in self.cache:
+                return
+            self.cache[entry.path] = entry
+            self.cached_bytes += entry.size
+            while self.cached_bytes > self.cache_size and self.cache:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted.size
+
+    def not_modified(self, headers, entry):
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return int(entry.mtime // 1_000_000_000) <= since
+        return False
+
+    def requested_ranges(self, headers, entry):
+        \"\"\"
+        Parses the Range header into a list of inclusive (first, last) byte positions.
+        Returns None when the full file should be sent (no/invalid Range, stale If-Range)
+        and [] when the range is valid but unsatisfiable.
+        \"\"\"
+        header = headers.get('Range')
+        if not header or not header.startswith('bytes='):
+            return None
+
+        if_range = headers.get('If-Range')
+        if if_range and if_range.strip() not in (entry.etag, entry.last_modified):
+            return None
+
+        size = entry.size
+        ranges = []
+        for part in header[len('bytes='):].split(','):
+            first, sep, last = part.strip().partition('-')
+            if not sep:
+                return None
+            if first:
+                if not first.isdigit() or (last and not last.isdigit()):
+                    return None
+                first = int(first)
+                last = int(last) if last else size - 1
+                if last < first and first < size:
+                    return None
+                if first < size:
+                    ranges.append((first, min(last, size - 1)))
+            else:
+                if not last.isdigit():
+                    return None
+                suffix = int(last)
+                if suffix > 0 and size > 0:
+                    ranges.append((max(size - suffix, 0), size - 1))
+
+        if len(ranges) > self.MAX_RANGES:
+            return None
+        return ranges
+
+    def serve(self, handler, head=False):
+        \"\"\"Writes the full response for handler.path. With head=True only the headers are sent.\"\"\"
+        relative_path = self.relative_path(handler.path)
+        entry = self.lookup(relative_path)
+        if entry is None:
+            handler.send_error(404, "File Not Found")
+            return
+
+        content_type = entry.content_type
+        extra_headers = []
+        if self.manifest is not None and self.manifest.is_fingerprinted(relative_path):
+            extra_headers.append(('Cache-Control', self.IMMUTABLE_CACHE_CONTROL))
+        else:
+            extra_headers.append(('Cache-Control', f'public, max-age={self.max_age}'))
+
+        if content_type.startswith(ResponseCompressor.COMPRESSIBLE_TYPES):
+            extra_headers.append(('Vary', 'Accept-Encoding'))
+            if ResponseCompressor.negotiate(handler.headers.get('Accept-Encoding')) == 'gzip':
+                compressed = self.lookup(relative_path + '.gz')
+                if compressed is not None:
+                    entry = compressed
+                    extra_headers.append(('Content-Encoding', 'gzip'))
+
+        if self.not_modified(handler.headers, entry):
+            handler.send_response(304)
+            self.send_validators(handler, entry, extra_headers)
+            handler.end_headers()
+            return
+
+        ranges = self.requested_ranges(handler.headers, entry)
+
+        if ranges == []:
+            handler.send_response(416)
+            handler.send_header('Content-Range', f'bytes */{entry.size}')
+            handler.send_header('Content-Length', '0')
+            self.send_validators(handler, entry, extra_headers)
+            handler.end_headers()
+            return
+
+        if ranges is None:
+            handler.send_response(200)
+            handler.send_header('Content-type', content_type)
+            handler.send_header('Content-Length', str(entry.size))
+            self.send_validators(handler, entry, extra_headers)
+            handler.end_headers()
+            if not head:
+                self.write_bytes(handler, entry, 0, entry.size)
+            return
+
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            handler.send_response(206)
+            handler.send_header('Content-type', content_type)
+            handler.send_header('Content-Range', f'bytes {first}-{last}/{entry.size}')
+            handler.send_header('Content-Length', str(last - first + 1))
+            self.send_validators(handler, entry, extra_headers)
+            handler.end_headers()
+            if not head:
+                self.write_bytes(handler, entry, first, last - first + 1)
+            return
+
+        # multipart/byteranges: part headers are small, so build them up front to get Content-Length
+        boundary = secrets.token_hex(16)
+        part_headers = [
+            (
+                f"\\r\\n--{boundary}\\r\\n"
+                f"Content-Type: {content_type}\\r\\n"
+                f"Content-Range: bytes {first}-{last}/{entry.size}\\r\\n\\r\\n"
+            ).encode('latin-1')
+            for first, last in ranges
+        ]
+        closing = f"\\r\\n--{boundary}--\\r\\n".encode('latin-1')
+        length = sum(len(p) for p in part_headers) + sum(last - first + 1 for first, last in ranges) + len(closing)
+
+        handler.send_response(206)
+        handler.send_header('Content-type', f'multipart/byteranges; boundary={boundary}')
+        handler.send_header('Content-Length', str(length))
+        self.send_validators(handler, entry, extra_headers)
+        handler.end_headers()
+        if head:
+            return
+
+        for part_header, (first, last) in zip(part_headers, ranges):
+            handler.wfile.write(part_header)
+            self.write_bytes(handler, entry, first, last - first + 1)
+        handler.wfile.write(closing)
+
+    def write_bytes(self, handler, entry, offset, count):
+        if entry.data is not None:
+            handler.wfile.write(memoryview(entry.data)[offset:offset + count])
+        else:
+            self.send_file(handler, entry.path, offset, count)
+
+    def send_validators(self, handler, entry, extra_headers=()):
+        handler.send_header('Accept-Ranges', 'bytes')
+        handler.send_header('ETag', entry.etag)
+        handler.send_header('Last-Modified', entry.last_modified)
+        for name, value in extra_headers:
+            handler.send_header(name, value)
+
+    @staticmethod
+    def send_file(handler, path, offset, count):
+        \"\"\"Zero-copy transfer: socket.sendfile() uses os.sendfile where the platform allows.\"\"\"
+        handler.wfile.flush()
+        with open(path, 'rb') as f:
+            handler.connection.sendfile(f, offset, count)
+"""
+
+COMPRESSION_PY = """
+import gzip
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from core.response import CachedBody
+
+class ResponseCompressor:
+    \"\"\"
+    Compresses response bodies with gzip or deflate, chosen from Accept-Encoding.
+    - Bodies smaller than min_size, or of types that are already compressed, are left alone.
+    - Compressed variants of CachedBody bodies (pages served by CacheNode) are cached
+      (LRU, keyed by encoding and a digest of the body), so a cached page is compressed
+      once. Other bodies are usually rendered fresh per request and are compressed directly.
+    \"\"\"
+    ENCODINGS = ('gzip', 'deflate') # in order of preference
+    COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+    def __init__(self, min_size=1024, level=6, cache_entries=256, cache_max_body=1024 * 1024):
+        self.min_size = min_size
+        self.level = level
+        self.cache_entries = cache_entries
+        self.cache_max_body = cache_max_body
+        self.cache = OrderedDict() # {(encoding, digest): compressed bytes}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def negotiate(cls, accept_encoding):
+        \"\"\"Returns the best supported encoding the client accepts, or None.\"\"\"
+        if not accept_encoding:
+            return None
+
+        qualities = {}
+        for item in accept_encoding.split(','):
+            name, _, params = item.strip().partition(';')
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            qualities[name.strip().lower()] = q
+
+        best, best_q = None, 0.0
+        for encoding in cls.ENCODINGS:
+            q = qualities.get(encoding, qualities.get('*', 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def is_compressible(self, content_type, body):
+        if len(body) < self.min_size:
+            return False
+        content_type = (content_type or '').lower()
+        return content_type.startswith(self.COMPRESSIBLE_TYPES)
+
+    def compress(self, body, encoding):
+        if len(body) > self.cache_max_body:
+            return self._compress(body, encoding)
+
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = self._compress(body, encoding)
+
+        with self.lock:
+            self.cache[key] = compressed
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return compressed
+
+    def _compress(self, body, encoding):
+        if encoding == 'gzip':
+            # mtime=0 keeps the output identical for identical input
+            return gzip.compress(body, compresslevel=self.level, mtime=0)
+        return zlib.compress(body, self.level)
+
+    def apply(self, headers, content_type, body):
+        \"\"\"
+        Returns (body, extra_headers) for a response to a request with `headers`.
+        extra_headers carries Content-Encoding and Vary when they apply.
+        \"\"\"
+        if not self.is_compressible(content_type, body):
+            return body, []
+
+        extra_headers = [('Vary', 'Accept-Encoding')]
+        encoding = self.negotiate(headers.get('Accept-Encoding'))
+        if encoding is None:
+            return body, extra_headers
+
+        if isinstance(body, CachedBody):
+            compressed = self.compress(body, encoding)
+        else:
+            compressed = self._compress(body, encoding)
+        if len(compressed) >= len(body):
+            return body, extra_headers
+
+        extra_headers.append(('Content-Encoding', encoding))
+        return compressed, extra_headers
+
+    def stream(self, headers, content_type, chunks):
+        \"\"\"
+        Streaming counterpart of apply(): returns (chunks, extra_headers).
+        Each chunk is compressed and flushed as it arrives, so streaming still
+        gets bytes to the client early. Streamed output is never cached.
+        \"\"\"
+        if not (content_type or '').lower().startswith(self.COMPRESSIBLE_TYPES):
+            return chunks, []
+
+        extra_headers = [('Vary', 'Accept-Encoding')]
+        encoding = self.negotiate(headers.get('Accept-Encoding'))
+        if encoding is None:
+            return chunks, extra_headers
+
+        extra_headers.append(('Content-Encoding', encoding))
+        return self._compress_stream(chunks, encoding), extra_headers
+
+    def _compress_stream(self, chunks, encoding):
+        # wbits 31 = gzip container, 15 = zlib container (what HTTP calls deflate)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+        chunks = iter(chunks)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+"""
+
+CACHE_PY = """
+import time
+import threading
+from collections import OrderedDict
+
+class CacheEntry:
+    __slots__ = ('value', 'size', 'expires', 'stale_until')
+
+    def __init__(self, value, size, expires, stale_until):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.stale_until = stale_until
+
+class LRUCache:
+    \"\"\"
+    Thread-safe in-memory cache with LRU eviction and per-entry expiry.
+    Bounded by entry count and, optionally, by total size (len() of str/bytes values).
+    Entries stay readable until `stale_until` so callers can serve stale data
+    while they refresh it; `get()` only returns fresh values.
+    \"\"\"
+    def __init__(self, max_entries=256, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # {key: CacheEntry}
+        self.total_size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def size_of(value):
+        return len(value) if isinstance(value, (str, bytes, bytearray)) else 1
+
+    def get_entry(self, key):
+        \"\"\"Returns the CacheEntry (fresh or stale), or None if missing or past stale_until.\"\"\"
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if now >= entry.stale_until:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is None or time.monotonic() >= entry.expires:
+            return default
+        return entry.value
+
+    def set(self, key, value, ttl=None, stale_ttl=0):
+        \"\"\"Stores value for ttl seconds (None = until evicted), readable as stale for stale_ttl more.\"\"\"
+        size = self.size_of(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        now = time.monotonic()
+        expires = now + ttl if ttl is not None else float('inf')
+        entry = CacheEntry(value, size, expires, expires + stale_ttl)
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.total_size += size
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or (self.max_bytes is not None and self.total_size > self.max_bytes)
+            ):
+                self._remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_size -= entry.size
+
+    def __len__(self):
+        return len(self.entries)
+"""
+
+CACHE_NODE_PY = """
+import time
+import threading
+import urllib.parse
+from nodes.base_node import BaseNode
+from core.cache import LRUCache
+from core.singleflight import SingleFlight
+from core.response import CachedBody
+
+class CacheNode(BaseNode):
+    \"\"\"
+    Full-page cache for the rest of the chain.
+    Place it in front of any branch: url.connect(CacheNode(ttl=30)).connect(logic).connect(render)
+
+    - Key: method, path, query params (order-insensitive) and the configured vary keys
+      (request headers, cookies, context values).
+    - ttl: seconds a page is served from memory without running the branch.
+    - stale_ttl: seconds after expiry during which the old page is still served while
+      one background refresh re-runs the branch (stale-while-revalidate).
+    - max_entries / max_bytes: LRU memory bounds.
+    Only `methods` (GET and HEAD by default) are cached.
+    On a miss, concurrent requests for the same key wait for one run of the branch
+    (up to coalesce_timeout seconds) instead of all rebuilding the page.
+    Pages that embed per-user values (like {csrf_token}) must vary on whatever identifies the user.
+    \"\"\"
+    def __init__(self, ttl=60, stale_ttl=0, max_entries=256, max_bytes=16 * 1024 * 1024,
+                 vary_headers=(), vary_cookies=(), vary_context=(), methods=('GET', 'HEAD'),
+                 coalesce_timeout=10):
+        super().__init__()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.vary_headers = tuple(vary_headers)
+        self.vary_cookies = tuple(vary_cookies)
+        self.vary_context = tuple(vary_context)
+        self.methods = set(methods)
+        self.cache = LRUCache(max_entries, max_bytes)
+        self.flight = SingleFlight(timeout=coalesce_timeout)
+        self.refreshing = set() # keys with a background refresh in flight
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def cache_key(self, request):
+        method = 'GET' if request.method == 'HEAD' else request.method
+        # Protected and unprotected renders of the same page are different pages
+        key = [method, request.path, getattr(request, 'screen_protection', None) is not None]
+
+        query_string = getattr(request, 'query_string', '')
+        if query_string:
+            key.append(tuple(sorted(urllib.parse.parse_qsl(query_string, keep_blank_values=True))))
+
+        for name in self.vary_headers:
+            key.append(request.headers.get(name))
+
+        for name in self.vary_cookies:
+            key.append(request.cookies.get(name))
+
+        for name in self.vary_context:
+            key.append(repr(request.context.get(name)))
+
+        return tuple(key)
+
+    def process(self, request):
+        if request.method not in self.methods:
+            return super().process(request)
+
+        key = self.cache_key(request)
+        entry = self.cache.get_entry(key)
+
+        if entry is not None:
+            if time.monotonic() < entry.expires:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self.revalidate(key, request)
+
+            # The cached page already went through RenderNode, protection script included
+            if getattr(request, 'screen_protection', None) is not None:
+                request.screen_protection = None
+            return entry.value
+
+        self.misses += 1
+        result = self.flight.do(key, lambda: self.build(key, request))
+        if getattr(request, 'screen_protection', None) is not None:
+            request.screen_protection = None # a coalesced waiter got the leader's rendered page
+        return result
+
+    def build(self, key, request):
+        result = super().process(request)
+        self.store(key, result)
+        return result
+
+    def store(self, key, result):
+        # Pages are kept encoded, so hits skip the str -> UTF-8 step; as CachedBody,
+        # the compressor caches their compressed variants too.
+        # Response objects (custom status/headers) and streams are never cached.
+        if isinstance(result, str):
+            result = result.encode('utf-8')
+        if isinstance(result, bytes):
+            self.cache.set(key, CachedBody(result), self.ttl, self.stale_ttl)
+
+    def revalidate(self, key, request):
+        \"\"\"Starts a background refresh for key unless one is already running.\"\"\"
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        snapshot = request.copy()
+        threading.Thread(target=self._refresh, args=(key, snapshot), daemon=True).start()
+
+    def _refresh(self, key, request):
+        try:
+            self.store(key, super().process(request))
+        except Exception as e:
+            print(f"Cache Refresh Error: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def invalidate(self, request=None):
+        \"\"\"Drops the entry for request, or the whole cache when called without one.\"\"\"
+        if request is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(self.cache_key(request))
+"""
+
+SINGLEFLIGHT_PY = """
+import threading
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    \"\"\"
+    Coalesces concurrent work on the same key.
+    The first caller for a key runs the function; callers that arrive while it is
+    running wait for it and share its result (or its exception). A waiter that
+    gives up after `timeout` seconds runs the function itself, so one stuck
+    leader can't stall everyone behind it.
+    Nothing is cached: once the leader finishes, the next call starts fresh.
+    \"\"\"
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.calls = {} # {key: _Call} in flight
+        self.lock = threading.Lock()
+        self.leaders = 0 # calls that ran the function
+        self.shared = 0 # calls that received a leader's result
+        self.timeouts = 0 # waiters that gave up and ran the function themselves
+
+    def do(self, key, func, timeout=None):
+        \"\"\"Returns func() for key, sharing one execution among concurrent callers.\"\"\"
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.leaders += 1
+
+        if not leader:
+            if call.event.wait(self.timeout if timeout is None else timeout):
+                self.shared += 1
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            self.timeouts += 1
+            return func()
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+            call.event.set()
+"""
+
+PARALLEL_NODE_PY = """
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import settings
+from nodes.base_node import BaseNode
+
+class ParallelNode(BaseNode):
+    \"\"\"
+    Runs independent sub-chains concurrently, merges their context updates, and continues.
+    Usage:
+        widgets = ParallelNode([node_weather, node_time])
+        url_index.connect(logic_index).connect(widgets).connect(render_index)
+
+    Each branch (the first node of a sub-chain) runs on request.copy(), so branches never
+    see each other's writes. Once all of them finish, the context keys each branch added
+    or changed are merged into request.context in branch order.
+
+    on_conflict decides what happens when two branches set the same key:
+    - 'error': raise ValueError (default)
+    - 'first': the earliest branch in the list wins
+    - 'last': the latest branch in the list wins
+
+    Branches run on a shared thread pool of settings.PARALLEL_MAX_WORKERS threads; the
+    first branch runs on the calling thread, and pool threads run in a copy of the caller's
+    context (so a traced request's branches show up in its trace). A ParallelNode nested in
+    another one's branch, already on a pool thread, runs its branches inline one after the
+    other: waiting on the pool from its own threads would deadlock once every worker waits.
+    Branch return values are ignored. If a branch raises, the exception is re-raised after
+    all branches have finished.
+    \"\"\"
+    CONFLICT_POLICIES = ('error', 'first', 'last')
+
+    _executor = None
+    _executor_lock = threading.Lock()
+    _local = threading.local() # pool_thread is set on the pool's own threads
+
+    def __init__(self, branches, on_conflict='error'):
+        super().__init__()
+        if on_conflict not in self.CONFLICT_POLICIES:
+            raise ValueError(f"on_conflict must be one of {self.CONFLICT_POLICIES}, got {on_conflict!r}")
+        self.branches = list(branches)
+        self.on_conflict = on_conflict
+
+    def children(self):
+        return self.branches + super().children()
+
+    @classmethod
+    def executor(cls):
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'PARALLEL_MAX_WORKERS', 8),
+                        thread_name_prefix='webnode-parallel',
+                        initializer=cls._mark_pool_thread,
+                    )
+        return cls._executor
+
+    @classmethod
+    def _mark_pool_thread(cls):
+        cls._local.pool_thread = True
+
+    @staticmethod
+    def run_branch(branch, branch_request):
+        branch.process(branch_request)
+        return branch_request.context
+
+    def process(self, request):
+        if not self.branches:
+            return super().process(request)
+
+        base = request.context
+        requests = [request.copy() for _ in self.branches]
+
+        branches = list(zip(self.branches, requests))
+        if getattr(self._local, 'pool_thread', False):
+            inline, pooled = branches, [] # nested: see the class docstring
+        else:
+            inline, pooled = branches[:1], branches[1:]
+
+        futures = [
+            self.executor().submit(contextvars.copy_context().run, self.run_branch, branch, branch_request)
+            for branch, branch_request in pooled
+        ]
+
+        results, error = [], None
+        for branch, branch_request in inline:
+            try:
+                results.append(self.run_branch(branch, branch_request))
+            except Exception as e:
+                error = error or e
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+        request.context.update(self.merge(base, results))
+        return super().process(request)
+
+    def merge(self, base, results):
+        \"\"\"Collects the keys each branch added or changed, applying the conflict policy.\"\"\"
+        merged, owners = {}, {}
+        for index, context in enumerate(results):
+            for key, value in context.items():
+                if key in base and base[key] is value:
+                    continue # untouched
+                if key in merged:
+                    if self.on_conflict == 'error':
+                        raise ValueError(
+                            f"ParallelNode branches {owners[key]} and {index} both set context key '{key}'"
+                        )
+                    if self.on_conflict == 'first':
+                        continue
+                merged[key] = value
+                owners[key] = index
+        return merged
+"""
+
+PROCESS_NODE_PY = """
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import settings
+from nodes.base_node import BaseNode
+
+class RequestSnapshot:
+    \"\"\"
+    Picklable view of a request, handed to ProcessLogicNode functions.
+    Carries the method, path, parameters and the selected context keys only:
+    the socket, headers and full context stay in the server process.
+    \"\"\"
+    def __init__(self, method, path, params, context, query=None):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.query = query or {}
+        self.context = context
+
+    def get_param(self, key, default=None, source='both'):
+        if source in ('form', 'both'):
+            val_list = self.params.get(key)
+            if val_list:
+                return val_list[0]
+        if source in ('query', 'both'):
+            val_list = self.query.get(key)
+            if val_list:
+                return val_list[0]
+        return default
+
+class ProcessLogicNode(BaseNode):
+    \"\"\"
+    Runs a CPU-bound logic function in a worker process, so it doesn't hold the GIL
+    of the process serving requests.
+    Usage: ProcessLogicNode(build_report, context_keys=['users'], timeout=5, fallback={'report': None})
+
+    - logic_func must be picklable: a module-level function (e.g. in static/logic.py).
+      It receives a RequestSnapshot and returns a dict, merged into request.context.
+    - context_keys: context values to send along; they must be picklable too.
+    - timeout: seconds to wait for the result (None = no limit).
+    - fallback: dict merged into request.context instead of the result when the timeout
+      passes; the chain then continues. The worker is not interrupted.
+    Workers come from one shared pool of settings.PROCESS_POOL_WORKERS processes.
+    \"\"\"
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, logic_func, context_keys=(), timeout=None, fallback=None):
+        super().__init__()
+        self.logic_func = logic_func
+        self.context_keys = tuple(context_keys)
+        self.timeout = timeout
+        self.fallback = fallback
+
+    @classmethod
+    def pool(cls):
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    workers = getattr(settings, 'PROCESS_POOL_WORKERS', None) or os.cpu_count()
+                    cls._pool = ProcessPoolExecutor(max_workers=workers)
+        return cls._pool
+
+    @classmethod
+    def shutdown(cls):
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown()
+                cls._pool = None
+
+    def snapshot(self, request):
+        context = {key: request.context[key] for key in self.context_keys if key in request.context}
+        return RequestSnapshot(request.method, request.path, request.params, context, request.query)
+
+    def process(self, request):
+        future = self.pool().submit(self.logic_func, self.snapshot(request))
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel() # only helps if it hasn't started yet
+            print(f"⚠️ [ProcessLogicNode] {getattr(self.logic_func, '__name__', self.logic_func)} timed out after {self.timeout}s")
+            result = dict(self.fallback) if self.fallback else None
+
+        if isinstance(result, dict):
+             request.context.update(result)
+
+        return super().process(request)
+"""
+
+MULTIPART_PY = """
+import os
+import re
+import shutil
+import tempfile
+from email.parser import HeaderParser
+from email.utils import collapse_rfc2231_value
+
+class RequestBodyError(ValueError):
+    \"\"\"A request body the framework refuses to read or parse. `status` is the HTTP status to answer with.\"\"\"
+    status = 400
+
+class RequestBodyTooLarge(RequestBodyError):
+    status = 413
+
+class UploadedFile:
+    \"\"\"
+    A file part of a multipart/form-data body.
+    The data lives in a SpooledTemporaryFile: in memory up to the spool threshold,
+    in an anonymous temp file beyond it, so uploads of any size never sit in memory whole.
+    \"\"\"
+    __slots__ = ('field_name', 'filename', 'content_type', 'headers', 'size', 'file')
+
+    def __init__(self, field_name, filename, content_type, headers, file):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
+        self.size = 0
+        self.file = file
+
+    def __repr__(self):
+        return f"<UploadedFile {self.filename!r} ({self.content_type}, {self.size} bytes)>"
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def chunks(self, chunk_size=64 * 1024):
+        \"\"\"Yields the file contents from the start, chunk_size bytes at a time.\"\"\"
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def save(self, path):
+        \"\"\"Copies the upload to path without loading it into memory.\"\"\"
+        self.file.seek(0)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(self.file, f)
+        return path
+
+    def close(self):
+        self.file.close()
+
+class MultipartParser:
+    \"\"\"
+    Streaming multipart/form-data parser.
+    Reads the body through `readinto` into one reusable buffer and writes each part
+    out as it arrives:
+    - plain fields are collected in memory (each up to max_field_size bytes)
+    - file parts go to UploadedFile objects, spooled to disk past spool_threshold bytes
+    Returns ({name: [values]}, {name: [UploadedFile]}), the same shape as parse_qs.
+    \"\"\"
+    CHUNK_SIZE = 64 * 1024
+    MAX_HEADER_SIZE = 16 * 1024
+
+    def __init__(self, readinto, boundary, spool_threshold=1024 * 1024, max_field_size=1024 * 1024,
+                 max_parts=1000, temp_dir=None, encoding='utf-8'):
+        if not boundary or len(boundary) > 200:
+            raise RequestBodyError("Invalid multipart boundary")
+        self.readinto = readinto
+        self.delimiter = b'\\r\\n--' + boundary.encode('latin-1')
+        self.spool_threshold = spool_threshold
+        self.max_field_size = max_field_size
+        self.max_parts = max_parts
+        self.temp_dir = temp_dir
+        self.encoding = encoding
+
+    @staticmethod
+    def boundary(content_type):
+        \"\"\"Returns the boundary from a multipart/form-data Content-Type, or None.\"\"\"
+        if not content_type or not content_type.lower().startswith('multipart/form-data'):
+            return None
+        match = re.search(r'boundary=(?:"([^"]+)"|([^\\s;]+))', content_type, re.I)
+        if match is None:
+            return None
+        return match.group(1) or match.group(2)
+
+    def parse(self):
+        fields, files = {}, {}
+        # The leading CRLF lets the first boundary match the same delimiter as the others
+        self.data = bytearray(b'\\r\\n')
+        self.chunk = bytearray(self.CHUNK_SIZE)
+        self.eof = False
+
+        try:
+            self.skip_to_delimiter()
+            parts = 0
+            while self.after_delimiter():
+                parts += 1
+                if parts > self.max_parts:
+                    raise RequestBodyError(f"Too many multipart parts (max {self.max_parts})")
+
+                headers = self.read_headers()
+                name = headers.get_param('name', header='content-disposition')
+                if name is None:
+                    raise RequestBodyError("Multipart part without a field name")
+                name = collapse_rfc2231_value(name)
+                filename = headers.get_filename()
+
+                if filename is None:
+                    value = bytearray()
+                    self.copy_part(value.extend, self.max_field_size)
+                    fields.setdefault(name, []).append(value.decode(self.encoding, errors='replace'))
+                else:
+                    upload = UploadedFile(
+                        name,
+                        os.path.basename(filename.replace('\\\\', '/')),
+                        headers.get_content_type() if headers.get('Content-Type') else 'application/octet-stream',
+                        headers,
+                        tempfile.SpooledTemporaryFile(max_size=self.spool_threshold, dir=self.temp_dir),
+                    )
+                    files.setdefault(name, []).append(upload)
+                    upload.size = self.copy_part(upload.file.write)
+                    upload.file.seek(0)
+        except BaseException:
+            for uploads in files.values():
+                for upload in uploads:
+                    upload.close()
+            raise
+        finally:
+            del self.data, self.chunk
+
+        return fields, files
+
+    def fill(self):
+        \"\"\"Appends the next chunk of the body to the working buffer. Returns False at end of body.\"\"\"
+        if self.eof:
+            return False
+        with memoryview(self.chunk) as view:
+            n = self.readinto(view)
+            if n:
+                self.data += view[:n]
+                return True
+        self.eof = True
+        return False
+
+    def skip_to_delimiter(self):
+        \"\"\"Discards the preamble up to and including the first delimiter.\"\"\"
+        keep = len(self.delimiter) - 1
+        while True:
+            index = self.data.find(self.delimiter)
+            if index >= 0:
+                del self.data[:index + len(self.delimiter)]
+                return
+            if len(self.data) > keep:
+                del self.data[:-keep]
+            if not self.fill():
+                raise RequestBodyError("Multipart body has no boundary")
+
+    def after_delimiter(self):
+        \"\"\"Consumes what follows a delimiter. Returns True if a part follows, False at the closing delimiter.\"\"\"
+        while len(self.data) < 2:
+            if not self.fill():
+                raise RequestBodyError("Multipart body ended unexpectedly")
+        if self.data[:2] == b'--':
+            return False
+
+        # Transport padding (spaces/tabs) may sit between the boundary and its CRLF
+        while True:
+            index = self.data.find(b'\\r\\n')
+            if index >= 0:
+                if self.data[:index].strip(b' \\t'):
+                    raise RequestBodyError("Malformed multipart boundary line")
+                del self.data[:index + 2]
+                return True
+            if len(self.data) > 1024 or not self.fill():
+                raise RequestBodyError("Malformed multipart boundary line")
+
+    def read_headers(self):
+        while True:
+            # A part without headers starts directly with the blank line
+            if self.data[:2] == b'\\r\\n':
+                del self.data[:2]
+                return HeaderParser().parsestr('')
+            index = self.data.find(b'\\r\\n\\r\\n')
+            if index >= 0:
+                # Browsers send non-ASCII filenames as raw UTF-8
+                raw = self.data[:index + 2].decode(self.encoding, errors='replace')
+                del self.data[:index + 4]
+                return HeaderParser().parsestr(raw)
+            if len(self.data) > self.MAX_HEADER_SIZE:
+                raise RequestBodyError("Multipart part headers too large")
+            if not self.fill():
+                raise RequestBodyError("Multipart body ended unexpectedly")
+
+    def copy_part(self, write, limit=None):
+        \"\"\"Feeds the part body to write() up to the next delimiter. Returns the part size.\"\"\"
+        keep = len(self.delimiter) - 1
+        size = 0
+        while True:
+            index = self.data.find(self.delimiter)
+            end = index if index >= 0 else max(len(self.data) - keep, 0)
+            if end:
+                size += end
+                if limit is not None and size > limit:
+                    raise RequestBodyTooLarge(f"Multipart field larger than {limit} bytes")
+                with memoryview(self.data) as view:
+                    write(view[:end])
+            if index >= 0:
+                del self.data[:index + len(self.delimiter)]
+                return size
+            del self.data[:end]
+            if not self.fill():
+                raise RequestBodyError("Multipart body ended unexpectedly")
+"""
+
+RESPONSE_PY = """
+from collections.abc import Iterable
+
+class CachedBody(bytes):
+    \"\"\"
+    Body bytes served from a cache (CacheNode): the same bytes go out on every hit,
+    so work derived from them, like the compressed variant, is worth caching too.
+    \"\"\"
+    __slots__ = ()
+
+class Response:
+    \"\"\"
+    A complete HTTP response, for nodes that need more than "200 + HTML string".
+    Usage: return Response("<h1>Slow down</h1>", status=429, headers={'Retry-After': '30'})
+
+    - body: str (sent as UTF-8), bytes-like (sent as-is, no re-encoding), or an iterable
+      of str/bytes chunks (streamed with chunked transfer encoding).
+    - headers: dict or list of (name, value) pairs. Content-Type defaults to HTML.
+    Plain str, bytes and chunk iterators returned by nodes are treated as 200 responses.
+    \"\"\"
+    __slots__ = ('status', 'headers', 'body')
+
+    DEFAULT_CONTENT_TYPE = 'text/html; charset=utf-8'
+    NO_BODY_STATUSES = (204, 304)
+
+    def __init__(self, body=b'', status=200, headers=None, content_type=None):
+        self.status = status
+        self.body = body
+        self.headers = list(headers.items() if isinstance(headers, dict) else headers or ())
+        if content_type is not None:
+            self.set_header('Content-Type', content_type)
+        elif self.get_header('Content-Type') is None:
+            self.headers.append(('Content-Type', self.DEFAULT_CONTENT_TYPE))
+
+    def __repr__(self):
+        return f"<Response {self.status} {self.get_header('Content-Type')}>"
+
+    @classmethod
+    def coerce(cls, result):
+        \"\"\"Turns a graph result into a Response. None and empty strings mean 'not found' (None).\"\"\"
+        if result is None or isinstance(result, cls):
+            return result
+        if isinstance(result, (str, bytes, bytearray, memoryview)):
+            return cls(result) if len(result) else None
+        return cls(result)
+
+    @staticmethod
+    def is_stream(body):
+        return isinstance(body, Iterable) and not isinstance(body, (str, bytes, bytearray, memoryview))
+
+    @property
+    def content_type(self):
+        return self.get_header('Content-Type')
+
+    @property
+    def has_body(self):
+        return self.status >= 200 and self.status not in self.NO_BODY_STATUSES
+
+    def get_header(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def set_header(self, name, value):
+        \"\"\"Replaces any existing values of the header.\"\"\"
+        lowered = name.lower()
+        self.headers = [(key, val) for key, val in self.headers if key.lower() != lowered]
+        self.headers.append((name, str(value)))
+
+    def add_header(self, name, value):
+        self.headers.append((name, str(value)))
+
+    def encoded_body(self):
+        \"\"\"The body as a bytes-like object (str is encoded once). Not for streamed bodies.\"\"\"
+        return self.body.encode('utf-8') if isinstance(self.body, str) else self.body
+"""
+
+METRICS_PY = """
+import os
+import json
+import math
+import time
+import threading
+from bisect import bisect_left
+import settings
+
+class Histogram:
+    \"\"\"
+    Fixed-bucket histogram of durations in seconds.
+    counts[i] holds observations <= bounds[i] (and above bounds[i-1]); the last slot
+    counts everything above the largest bound. Recording is one bisect and a few additions.
+    \"\"\"
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        \"\"\"Not locked: callers that share a histogram between threads hold their own lock.\"\"\"
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        \"\"\"Upper bound of the bucket holding the q-quantile (inf if it's in the overflow slot).\"\"\"
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        return self.bounds[index] if index < len(self.bounds) else float('inf')
+
+    def copy(self):
+        clone = Histogram(self.bounds)
+        clone.counts = list(self.counts)
+        clone.count = self.count
+        clone.sum = self.sum
+        return clone
+
+def walk(root):
+    \"\"\"
+    Yields (node, route, name) for every node reachable from root, in graph order.
+    route is the path of the URLNode a node sits behind ('' on the main line); name is
+    the class name, with '#2', '#3'... for repeats of a class within the same route.
+    \"\"\"
+    seen = set()
+    occurrences = {} # {(route, class name): count}
+    pending = [(root, '')]
+    while pending:
+        node, route = pending.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+
+        # URLNodes open a route: everything after them is named under their path
+        path = getattr(node, 'path', None)
+        if isinstance(path, str):
+            route = path
+
+        class_name = type(node).__name__
+        count = occurrences[(route, class_name)] = occurrences.get((route, class_name), 0) + 1
+        yield node, route, (class_name if count == 1 else f"{class_name}#{count}")
+
+        # Reversed, so the walk follows the graph's own order
+        for child in reversed(node.children()):
+            pending.append((child, route))
+
+class NodeStats:
+    \"\"\"
+    Timings of one node instance.
+    - wall / cpu: self time (time spent in the node minus the nodes it called), per call
+    - total: inclusive wall time (the node and everything after it)
+    \"\"\"
+    __slots__ = ('route', 'name', 'wall', 'cpu', 'total', 'lock')
+
+    def __init__(self, route, name):
+        self.route = route
+        self.name = name
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, wall, cpu, total):
+        with self.lock:
+            self.wall.observe(wall)
+            self.cpu.observe(cpu)
+            self.total += total
+
+    def snapshot(self):
+        with self.lock:
+            return self.wall.copy(), self.cpu.copy(), self.total
+
+class NodeTimer:
+    \"\"\"
+    Opt-in per-node timing (settings.METRICS['NODE_TIMING']).
+    instrument(root) walks the graph from root and replaces each node's `process` with a
+    timed wrapper on that instance only, so nothing is added to the hot path until it is
+    turned on. Wall time comes from perf_counter, CPU time from thread_time.
+
+    Nodes are named after their class and route: 'ModelNode' on the main line,
+    '/users ModelNode' inside the '/users' branch, '/users ModelNode#2' for a second
+    ModelNode in the same branch. Names depend only on the graph's shape, so they stay
+    the same across restarts.
+    \"\"\"
+    def __init__(self):
+        self.stats = {} # {(route, name): NodeStats}
+        self.instrumented = set() # ids of wrapped nodes
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def instrument(self, root):
+        \"\"\"Wraps every node reachable from root that isn't wrapped yet.\"\"\"
+        with self.lock:
+            for node, route, name in walk(root):
+                if id(node) not in self.instrumented:
+                    stats = self.stats.setdefault((route, name), NodeStats(route, name))
+                    self.wrap(node, stats)
+                    self.instrumented.add(id(node))
+
+    def wrap(self, node, stats):
+        process = node.process
+        local = self.local
+        perf_counter, thread_time = time.perf_counter, time.thread_time
+
+        def timed_process(data):
+            # One frame per node on this thread's call stack; children add their time to it
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = []
+            frame = [0.0, 0.0]
+            stack.append(frame)
+            wall_start, cpu_start = perf_counter(), thread_time()
+            try:
+                return process(data)
+            finally:
+                wall, cpu = perf_counter() - wall_start, thread_time() - cpu_start
+                stack.pop()
+                if stack:
+                    stack[-1][0] += wall
+                    stack[-1][1] += cpu
+                stats.record(wall - frame[0], cpu - frame[1], wall)
+
+        node.process = timed_process
+
+    def reset(self):
+        \"\"\"Clears recorded timings (nodes stay instrumented).\"\"\"
+        for stats in list(self.stats.values()):
+            with stats.lock:
+                stats.wall, stats.cpu, stats.total = Histogram(), Histogram(), 0.0
+
+    def report(self):
+        \"\"\"One dict per node, slowest (by total self wall time) first.\"\"\"
+        rows = []
+        for stats in list(self.stats.values()):
+            wall, cpu, total = stats.snapshot()
+            if not wall.count:
+                continue
+            rows.append({
+                'route': stats.route,
+                'node': stats.name,
+                'calls': wall.count,
+                'wall_total': wall.sum,
+                'wall_mean': wall.sum / wall.count,
+                'wall_p50': wall.quantile(0.5),
+                'wall_p95': wall.quantile(0.95),
+                'wall_p99': wall.quantile(0.99),
+                'cpu_total': cpu.sum,
+                'inclusive_total': total,
+            })
+        rows.sort(key=lambda row: row['wall_total'], reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = [f"{'node':<40} {'calls':>8} {'self ms':>10} {'mean ms':>9} {'p95 ms':>9} {'cpu ms':>10} {'incl ms':>10}"]
+        for row in self.report():
+            name = f"{row['route']} {row['node']}".strip()
+            lines.append(
+                f"{name:<40} {row['calls']:>8} {row['wall_total'] * 1000:>10.2f} {row['wall_mean'] * 1000:>9.3f} "
+                f"{row['wall_p95'] * 1000:>9.3f} {row['cpu_total'] * 1000:>10.2f} {row['inclusive_total'] * 1000:>10.2f}"
+            )
+        return "\\n".join(lines)
+
+class MetricsRegistry:
+    \"\"\"
+    Process-wide counters, gauges and histograms, exported in the Prometheus text format.
+    Samples are keyed by metric name and a tuple of (label, value) pairs.
+
+    Multi-process servers set METRICS['DIR']: every process writes its snapshot to
+    <DIR>/metrics-<pid>.json (every METRICS['FLUSH_INTERVAL'] seconds, and on each scrape),
+    and a scrape of any process merges all of them. Counters and histograms are summed
+    over every file; gauges only over processes that are still alive.
+    \"\"\"
+    HELP = {
+        'webnode_requests_total': ('counter', 'Requests handled, by route, method and status.'),
+        'webnode_request_duration_seconds': ('histogram', 'Time to handle a request, response body included.'),
+        'webnode_requests_in_flight': ('gauge', 'Requests being handled right now.'),
+        'webnode_db_queries_total': ('counter', 'Database calls, by operation.'),
+        'webnode_db_query_duration_seconds': ('histogram', 'Database call duration, by operation.'),
+        'webnode_db_transactions_total': ('counter', 'Database transactions, by outcome (commit, rollback).'),
+        'webnode_db_transaction_duration_seconds': ('histogram', 'Database transaction duration, statements included.'),
+        'webnode_cache_hits_total': ('counter', 'Cache hits, by cache.'),
+        'webnode_cache_misses_total': ('counter', 'Cache misses, by cache.'),
+        'webnode_cache_hit_ratio': ('gauge', 'hits / (hits + misses), by cache.'),
+        'webnode_rejections_total': ('counter', 'Requests rejected by security nodes, by node.'),
+        'webnode_node_duration_seconds': ('histogram', 'Self wall time per node (METRICS NODE_TIMING).'),
+    }
+
+    def __init__(self):
+        self.counters = {} # {(name, labels): value}
+        self.gauges = {}
+        self.histograms = {} # {(name, labels): Histogram}
+        self.collectors = [] # callables run at snapshot time, returning (kind, name, labels, value)
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add(self, name, amount, labels=()):
+        \"\"\"Moves a gauge up or down.\"\"\"
+        key = (name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        \"\"\"This process's metrics as a JSON-serializable dict.\"\"\"
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {key: histogram.copy() for key, histogram in self.histograms.items()}
+
+        for collect in self.collectors:
+            for kind, name, labels, value in collect():
+                if kind == 'counter':
+                    counters[(name, labels)] = counters.get((name, labels), 0) + value
+                elif kind == 'gauge':
+                    gauges[(name, labels)] = gauges.get((name, labels), 0) + value
+                else:
+                    histograms[(name, labels)] = value
+
+        return {
+            'pid': os.getpid(),
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+            'histograms': [
+                [name, list(labels), list(h.bounds), h.counts, h.sum]
+                for (name, labels), h in histograms.items()
+            ],
+        }
+
+    @staticmethod
+    def merge(snapshots, alive=None):
+        \"\"\"Sums snapshots from several processes. Gauges only count pids in `alive` (all if None).\"\"\"
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            if alive is None or snapshot['pid'] in alive:
+                for name, labels, value in snapshot['gauges']:
+                    key = (name, tuple(map(tuple, labels)))
+                    gauges[key] = gauges.get(key, 0) + value
+            for name, labels, bounds, counts, total in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram(bounds)
+                if list(histogram.bounds) != list(bounds):
+                    continue # bucket layout changed between versions; skip rather than mix
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.count += sum(counts)
+                histogram.sum += total
+
+        # Ratios are derived after merging, so they cover all processes
+        for (name, labels), hits in list(counters.items()):
+            if name == 'webnode_cache_hits_total':
+                misses = counters.get(('webnode_cache_misses_total', labels), 0)
+                if hits + misses:
+                    gauges[('webnode_cache_hit_ratio', labels)] = hits / (hits + misses)
+        return counters, gauges, histograms
+
+    def collect(self):
+        \"\"\"Merged (counters, gauges, histograms) for this process, or all of them if METRICS['DIR'] is set.\"\"\"
+        snapshot = self.snapshot()
+        directory = getattr(settings, 'METRICS', {}).get('DIR')
+        if not directory:
+            return self.merge([snapshot])
+
+        self.write(directory, snapshot)
+        snapshots, alive = [], set()
+        for filename in os.listdir(directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                    other = json.load(f)
+            except (OSError, ValueError):
+                continue # being replaced or corrupt; the next scrape will see it
+            snapshots.append(other)
+            if pid_alive(other.get('pid')):
+                alive.add(other['pid'])
+        return self.merge(snapshots, alive)
+
+    @staticmethod
+    def write(directory, snapshot):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{snapshot['pid']}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path) # readers never see a half-written file
+
+    def start_flusher(self):
+        \"\"\"Starts the background thread that writes this process's snapshot to METRICS['DIR'].\"\"\"
+        config = getattr(settings, 'METRICS', {})
+        directory = config.get('DIR')
+        if not directory or self.flusher is not None:
+            return
+        interval = config.get('FLUSH_INTERVAL', 5)
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(directory, self.snapshot())
+                except Exception as e:
+                    print(f"Metrics Flush Error: {e}")
+
+        self.flusher = threading.Thread(target=flush, name='webnode-metrics', daemon=True)
+        self.flusher.start()
+
+    def render(self):
+        \"\"\"The merged metrics in the Prometheus text exposition format.\"\"\"
+        counters, gauges, histograms = self.collect()
+
+        families = {}
+        for (name, labels), value in sorted(counters.items()):
+            families.setdefault(name, []).append(f"{name}{format_labels(labels)} {format_value(value)}")
+        for (name, labels), value in sorted(gauges.items()):
+            families.setdefault(name, []).append(f"{name}{format_labels(labels)} {format_value(value)}")
+        for (name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        output = []
+        for name in sorted(families):
+            kind, help_text = self.HELP.get(name, ('untyped', name))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(families[name])
+        return "\\n".join(output) + "\\n"
+
+def escape_label(value):
+    return str(value).replace('\\\\', '\\\\\\\\').replace('"', '\\\\"').replace('\\n', '\\\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+def pid_alive(pid):
+    if not isinstance(pid, int):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass # exists, owned by someone else
+    return True
+
+def graph_collector(root):
+    \"\"\"
+    Collector for counters that nodes keep themselves: cache hits/misses
+    (CacheNode, MemoizedLogicNode) and security rejections (`rejected`).
+    Nodes are labelled with the names from walk().
+    \"\"\"
+    def collect():
+        for node, route, name in walk(root):
+            label = f"{route} {name}".strip()
+            if hasattr(node, 'hits') and hasattr(node, 'misses'):
+                labels = (('cache', label),)
+                yield 'counter', 'webnode_cache_hits_total', labels, node.hits + getattr(node, 'stale_hits', 0)
+                yield 'counter', 'webnode_cache_misses_total', labels, node.misses
+            if hasattr(node, 'rejected'):
+                yield 'counter', 'webnode_rejections_total', (('node', label),), node.rejected
+    return collect
+
+def node_timer_collector():
+    for stats in list(node_timer.stats.values()):
+        wall, _, _ = stats.snapshot()
+        if wall.count:
+            yield 'histogram', 'webnode_node_duration_seconds', (('route', stats.route), ('node', stats.name)), wall
+
+def database_hook(operation, query, params, seconds):
+    \"\"\"Database query hook: counts and times every call.\"\"\"
+    labels = (('operation', operation),)
+    registry.inc('webnode_db_queries_total', labels)
+    registry.observe('webnode_db_query_duration_seconds', seconds, labels)
+
+def transaction_hook(seconds, committed):
+    \"\"\"Database transaction hook: counts transactions by outcome and times them.\"\"\"
+    registry.inc('webnode_db_transactions_total', (('outcome', 'commit' if committed else 'rollback'),))
+    registry.observe('webnode_db_transaction_duration_seconds', seconds)
+
+# Shared by the whole process
+node_timer = NodeTimer()
+registry = MetricsRegistry()
+registry.collectors.append(node_timer_collector)
+"""
+
+TRACING_PY = """
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+import settings
+from core.metrics import walk
+
+# The span the current request is in; None when the request isn't traced.
+# A ContextVar rather than a thread local so ParallelNode can hand it to its branch threads.
+current_span = contextvars.ContextVar('webnode_current_span', default=None)
+
+class Span:
+    __slots__ = ('trace', 'name', 'category', 'span_id', 'parent_id', 'start', 'end', 'thread', 'args')
+
+    def __init__(self, trace, name, category, parent_id, start=None, args=None):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.perf_counter_ns() if start is None else start
+        self.end = None
+        self.thread = threading.get_ident()
+        self.args = args or {}
+        trace.spans.append(self)
+
+    def finish(self, end=None):
+        self.end = time.perf_counter_ns() if end is None else end
+
+    def child(self, name, category, start=None, args=None):
+        return Span(self.trace, name, category, self.span_id, start, args)
+
+    def event(self, pid):
+        \"\"\"Chrome trace 'complete' event (ts/dur in microseconds); ids follow OTLP sizes.\"\"\"
+        trace = self.trace
+        end = self.end if self.end is not None else time.perf_counter_ns()
+        args = {'trace_id': trace.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id}
+        args.update(self.args)
+        return {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': trace.wall_start_us + (self.start - trace.perf_start) / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': pid,
+            'tid': self.thread,
+            'args': args,
+        }
+
+class Trace:
+    __slots__ = ('trace_id', 'sampled', 'spans', 'wall_start_us', 'perf_start')
+
+    def __init__(self, sampled):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans = []
+        self.wall_start_us = time.time_ns() / 1000
+        self.perf_start = time.perf_counter_ns()
+
+class Tracer:
+    \"\"\"
+    Sampled per-request tracing (settings.TRACING).
+    A traced request gets a root span, a child span for every node it passes through
+    (server, request, security, router, branch nodes) and for every Database call.
+    Finished traces are appended to TRACING['FILE'] as JSON lines, one Chrome trace
+    event per span. `jq -s . traces.jsonl > trace.json` gives a file that
+    chrome://tracing and Perfetto open directly.
+
+    - SAMPLE_RATE: fraction of requests traced.
+    - SLOW_THRESHOLD: seconds; when set, every request is recorded and the ones at least
+      this slow are written even if they weren't sampled. This costs a few span objects per node
+      on every request.
+    \"\"\"
+    def __init__(self):
+        self.instrumented = set() # ids of wrapped nodes
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @property
+    def config(self):
+        return getattr(settings, 'TRACING', {})
+
+    def instrument(self, root):
+        \"\"\"Wraps every node reachable from root so it opens a span while a trace is active.\"\"\"
+        with self.lock:
+            for node, route, name in walk(root):
+                if id(node) not in self.instrumented:
+                    self.wrap(node, f"{route} {name}".strip())
+                    self.instrumented.add(id(node))
+
+    @staticmethod
+    def wrap(node, name):
+        process = node.process
+
+        def traced_process(data):
+            parent = current_span.get()
+            if parent is None:
+                return process(data)
+            span = parent.child(name, 'node')
+            token = current_span.set(span)
+            try:
+                return process(data)
+            finally:
+                current_span.reset(token)
+                span.finish()
+
+        node.process = traced_process
+
+    def begin(self, name, args=None):
+        \"\"\"Starts the root span of a request. Returns (span, token), or None if not traced.\"\"\"
+        config = self.config
+        sampled = random.random() < config.get('SAMPLE_RATE', 0.01)
+        if not sampled and config.get('SLOW_THRESHOLD') is None:
+            return None
+        root = Span(Trace(sampled), name, 'request', None, args=args)
+        return root, current_span.set(root)
+
+    def end(self, started, args=None):
+        root, token = started
+        current_span.reset(token)
+        root.finish()
+        if args:
+            root.args.update(args)
+
+        trace = root.trace
+        threshold = self.config.get('SLOW_THRESHOLD')
+        if trace.sampled or (threshold is not None and (root.end - root.start) / 1e9 >= threshold):
+            self.write(trace)
+
+    def write(self, trace):
+        path = self.config.get('FILE')
+        if not path:
+            return
+        lines = ''.join(json.dumps(span.event(self.pid)) + "\\n" for span in trace.spans)
+        try:
+            with self.lock:
+                directory = os.path.dirname(path)
+                if directory: # a bare filename is relative to the working directory
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"Trace Write Error: {e}")
+
+    @staticmethod
+    def database_hook(operation, query, params, seconds):
+        \"\"\"Database query hook: adds a child span to the traced request, if any.\"\"\"
+        parent = current_span.get()
+        if parent is None:
+            return
+        end = time.perf_counter_ns()
+        span = parent.child(f"db.{operation}", 'db', start=end - int(seconds * 1e9),
+                            args={'db.statement': query[:500]})
+        span.finish(end)
+
+    @staticmethod
+    def transaction_hook(seconds, committed):
+        \"\"\"Database transaction hook: adds a db.transaction span to the traced request, if any.\"\"\"
+        parent = current_span.get()
+        if parent is None:
+            return
+        end = time.perf_counter_ns()
+        span = parent.child('db.transaction', 'db', start=end - int(seconds * 1e9),
+                            args={'db.outcome': 'commit' if committed else 'rollback'})
+        span.finish(end)
+
+# Shared by the whole process
+tracer = Tracer()
+"""
+
+PROFILING_PY = """
+import os
+import re
+import hmac
+import time
+import itertools
+import cProfile
+import threading
+import tracemalloc
+from urllib.parse import unquote
+import settings
+
+class Capture:
+    __slots__ = ('cpu', 'memory', 'before', 'reason')
+
+    def __init__(self, cpu, memory, before, reason):
+        self.cpu = cpu # cProfile.Profile or None
+        self.memory = memory # True if this capture owns tracemalloc
+        self.before = before # tracemalloc snapshot at the start
+        self.reason = reason
+
+class RequestProfiler:
+    \"\"\"
+    Runs selected requests under cProfile and/or tracemalloc (settings.PROFILING) and
+    dumps the results to PROFILING['DIR'], tagged with the route:
+        <route>-<time>-<pid>-<n>.prof           cProfile stats (pstats, snakeviz, ...)
+        <route>-<time>-<pid>-<n>.snapshot       tracemalloc snapshot (tracemalloc.Snapshot.load)
+        <route>-<time>-<pid>-<n>.memory.txt     top allocations made during the request
+
+    A request is captured when:
+    - it sends PROFILING['HEADER'] with PROFILING['TOKEN'] (optionally "<token>:memory",
+      ":cpu" or ":both" to pick the mode), or
+    - its path has captures left in PROFILING['ROUTES'] ({'/users': 5} = the next 5
+      requests to /users), or in counts added at runtime with arm().
+
+    cProfile only sees the request's own thread (not ParallelNode pool threads).
+    Only one capture of each kind runs at a time: tracemalloc is process-wide, and from
+    Python 3.12 only one profiler can be active. A request that wants a kind already in
+    use gets the other kind, or is not captured.
+    \"\"\"
+    MODES = ('cpu', 'memory', 'both')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None # {path: (remaining, mode)}, seeded from settings on first use
+        self.memory_busy = False
+        self.cpu_busy = False
+        self.sequence = itertools.count(1)
+
+    @property
+    def config(self):
+        return getattr(settings, 'PROFILING', {})
+
+    def arm(self, path, count=1, mode=None):
+        \"\"\"Captures the next `count` requests to `path`.\"\"\"
+        mode = mode or self.config.get('MODE', 'cpu')
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode!r}")
+        with self.lock:
+            self._load_pending()
+            self.pending[path] = (count, mode)
+
+    def _load_pending(self):
+        if self.pending is None:
+            default = self.config.get('MODE', 'cpu')
+            self.pending = {path: (count, default) for path, count in self.config.get('ROUTES', {}).items()}
+
+    def requested_mode(self, handler):
+        \"\"\"The capture mode this request asked for, or None.\"\"\"
+        config = self.config
+        token = config.get('TOKEN')
+        value = handler.headers.get(config.get('HEADER', 'X-Webnode-Profile')) if token else None
+        if value:
+            value, _, mode = value.partition(':')
+            if hmac.compare_digest(value.encode(), str(token).encode()):
+                return mode if mode in self.MODES else config.get('MODE', 'cpu')
+
+        with self.lock:
+            self._load_pending()
+            if not self.pending:
+                return None
+            path = unquote(handler.path.partition('?')[0])
+            remaining, mode = self.pending.get(path, (0, None))
+            if remaining <= 0:
+                return None
+            if remaining == 1:
+                del self.pending[path]
+            else:
+                self.pending[path] = (remaining - 1, mode)
+            return mode
+
+    def begin(self, handler):
+        \"\"\"Starts a capture if this request should be profiled. Returns a Capture or None.\"\"\"
+        mode = self.requested_mode(handler)
+        if mode is None:
+            return None
+
+        memory, before = False, None
+        if mode in ('memory', 'both'):
+            with self.lock:
+                if not self.memory_busy:
+                    self.memory_busy = memory = True
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.config.get('TRACEMALLOC_FRAMES', 10))
+                else:
+                    memory = 'shared' # started elsewhere; leave it running
+                before = self.snapshot()
+
+        cpu = None
+        if mode in ('cpu', 'both') or not memory:
+            with self.lock:
+                cpu_free = not self.cpu_busy
+                self.cpu_busy = True
+            if cpu_free:
+                cpu = cProfile.Profile()
+                try:
+                    cpu.enable()
+                except ValueError:
+                    # Another profiler (not ours) is active
+                    cpu = None
+                    with self.lock:
+                        self.cpu_busy = False
+
+        if cpu is None and not memory:
+            return None
+        return Capture(cpu, memory, before, mode)
+
+    @staticmethod
+    def snapshot():
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def end(self, capture, route):
+        if capture.cpu is not None:
+            capture.cpu.disable()
+            with self.lock:
+                self.cpu_busy = False
+        after = self.snapshot() if capture.memory else None
+        if capture.memory is True:
+            tracemalloc.stop()
+        if capture.memory:
+            with self.lock:
+                self.memory_busy = False
+
+        directory = self.config.get('DIR') or os.path.join(os.getcwd(), 'profiles')
+        tag = re.sub(r'[^A-Za-z0-9_.-]+', '_', route.strip('/')) or 'root'
+        base = os.path.join(directory, f"{tag}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self.sequence)}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if capture.cpu is not None:
+                capture.cpu.dump_stats(base + '.prof')
+            if after is not None:
+                after.dump(base + '.snapshot')
+                with open(base + '.memory.txt', 'w', encoding='utf-8') as f:
+                    f.write(f"Top allocations during {route}\\n")
+                    for stat in after.compare_to(capture.before, 'lineno')[:30]:
+                        f.write(f"{stat}\\n")
+        except OSError as e:
+            print(f"Profile Write Error: {e}")
+            return None
+        print(f"📊 [Profiling] {route} ({capture.reason}) -> {base}.*")
+        return base
+
+# Shared by the whole process
+profiler = RequestProfiler()
+"""
+
+QUERY_LOG_PY = """
+import re
+import logging
+import threading
 import settings
-from contextlib import contextmanager
 
-class Database:
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
-            cls._instance.db_path = os.path.join(settings.BASE_DIR, 'db.sqlite3')
-            cls._instance.conn = None 
-        return cls._instance
+logger = logging.getLogger('webnode.db')
 
-    def get_connection(self):
-        \"\"\"Returns a new connection. 
-        Note: For transactions, we should usually reuse a connection or manage it carefully.
-        Here we return a fresh one for general use, but the transaction manager handles its own.\"\"\"
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.execute("PRAGMA foreign_keys = ON;") # Enable Foreign Keys
-        return conn
+class QueryShape:
+    __slots__ = ('shape', 'count', 'total', 'max', 'rows', 'slow', 'plan')
 
-    def execute(self, query, params=()):
-        conn = self.get_connection()
-        conn.row_factory = sqlite3.Row
-        # self._register_default_functions(conn) # Register standard 'stored procs'
-        cursor = conn.cursor()
-        try:
-            cursor.execute(query, params)
-            conn.commit()
-            return cursor
-        except Exception as e:
-            print(f"Database Error: {e}")
-            raise e
-        finally:
-            conn.close()
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.plan = None # EXPLAIN QUERY PLAN text, captured at the first slow run
 
-    def executemany(self, query, params_list):
-        \"\"\"Bulk insert/update optimization.\"\"\"
-        conn = self.get_connection()
-        try:
-            with conn:
-                conn.executemany(query, params_list)
-        except Exception as e:
-            print(f"Database Error (Bulk): {e}")
-            raise e
-        finally:
-            conn.close()
+class QueryLog:
+    \"\"\"
+    Per-query-shape statistics and a slow query log for core.db.Database (settings.SLOW_QUERY_LOG).
+    A query's shape is its SQL with literals replaced by '?' and IN lists collapsed, so
+    "WHERE id = 3" and "WHERE id = 4" are aggregated together.
+
+    Queries slower than THRESHOLD seconds are logged as warnings on the 'webnode.db' logger
+    with their duration, row count, parameters (see PARAMS) and EXPLAIN QUERY PLAN output.
+    Python's default logging setup prints warnings to stderr; configure the logger to send
+    them elsewhere.
+    \"\"\"
+    PARAM_MODES = ('show', 'redact', 'hide')
+    EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+    STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+    NUMBER_LITERAL = re.compile(r"(?<![\\w.])-?\\d+(?:\\.\\d+)?\\b")
+    IN_LIST = re.compile(r"\\bIN\\s*\\(\\s*\\?(?:\\s*,\\s*\\?)*\\s*\\)", re.IGNORECASE)
+    WHITESPACE = re.compile(r"\\s+")
 
-    def executescript(self, script):
-        \"\"\"Run a raw SQL script (good for migrations/triggers).\"\"\"
-        conn = self.get_connection()
-        try:
-            with conn:
-                conn.executescript(script)
-        except Exception as e:
-            print(f"Database Error (Script): {e}")
-            raise e
-        finally:
-            conn.close()
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shapes = {}
+        self._shape_cache = {} # raw SQL -> shape; the same few query strings recur
+
+    @property
+    def config(self):
+        return getattr(settings, 'SLOW_QUERY_LOG', {})
+
+    @property
+    def enabled(self):
+        return self.config.get('ENABLED', True)
+
+    def shape(self, query):
+        shape = self._shape_cache.get(query)
+        if shape is None:
+            shape = self.STRING_LITERAL.sub('?', query)
+            shape = self.NUMBER_LITERAL.sub('?', shape)
+            shape = self.IN_LIST.sub('IN (...)', shape)
+            shape = self.WHITESPACE.sub(' ', shape).strip().rstrip(';')
+            if len(self._shape_cache) < 4096:
+                self._shape_cache[query] = shape
+        return shape
+
+    def record(self, db, operation, query, params, seconds, rows=None):
+        config = self.config
+        key = self.shape(query)
+        threshold = config.get('THRESHOLD', 0.1)
+        slow = threshold is not None and seconds >= threshold
+
+        with self.lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= config.get('MAX_SHAPES', 1000):
+                    key = '<other>'
+                    stats = self.shapes.get(key)
+                if stats is None:
+                    stats = self.shapes[key] = QueryShape(key)
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            if rows is not None and rows > 0:
+                stats.rows += rows
+            if slow:
+                stats.slow += 1
+            need_plan = slow and stats.plan is None and config.get('EXPLAIN', True)
+
+        if not slow:
+            return
+        if need_plan:
+            stats.plan = self.explain(db, query, params if operation != 'executemany' else self.first(params))
+        logger.warning(
+            "Slow query: %.1f ms, %s, rows=%s, params=%s\\n  %s%s",
+            seconds * 1000, operation, '?' if rows is None or rows < 0 else rows,
+            self.format_params(params, operation), query.strip(),
+            f"\\n  Plan:\\n{stats.plan}" if stats.plan else '',
+        )
 
-    def fetchall(self, query, params=()):
-        conn = self.get_connection()
-        conn.row_factory = sqlite3.Row
-        # self._register_default_functions(conn)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Database Error: {e}")
-            return []
-        finally:
-            conn.close()
-            
-    # --- "PL/SQL" Features (Stored Procedures / Functions) ---
-    def register_function(self, conn, name, num_params, func):
-        \"\"\"
-        Registers a Python function as a SQL function (Stored Procedure).
-        Usage in SQL: SELECT my_func(col) FROM table...
-        \"\"\"
-        conn.create_function(name, num_params, func)
+    @staticmethod
+    def first(params_list):
+        return params_list[0] if isinstance(params_list, (list, tuple)) and params_list else None
+
+    def format_params(self, params, operation):
+        mode = self.config.get('PARAMS', 'redact')
+        if mode == 'hide':
+            return '<hidden>'
+        if operation == 'executemany':
+            count = len(params) if isinstance(params, (list, tuple)) else '?'
+            params = self.first(params)
+            if params is None:
+                return f"<{count} sets>"
+            return f"<{count} sets, first: {self.format_params(params, 'execute')}>"
+        if mode == 'show':
+            return repr(params)
+        if isinstance(params, dict):
+            return '{' + ', '.join(f"{key!r}: {self.redact(value)}" for key, value in params.items()) + '}'
+        return '(' + ', '.join(self.redact(value) for value in params or ()) + ')'
 
-    @contextmanager
-    def transaction(self):
-        \"\"\"
-        Transaction Context Manager.
-        Usage:
-            with db.transaction() as conn:
-                db.execute_on_conn(conn, q1)
-                db.execute_on_conn(conn, q2)
-        \"\"\"
-        conn = self.get_connection()
+    @staticmethod
+    def redact(value):
+        \"\"\"Keeps a value's type and size, never its content.\"\"\"
+        if value is None:
+            return 'None'
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__}:{len(value)}>"
+        return f"<{type(value).__name__}>"
+
+    def explain(self, db, query, params):
+        \"\"\"EXPLAIN QUERY PLAN on a fresh connection, formatted as an indented tree.\"\"\"
+        if not query.lstrip().upper().startswith(self.EXPLAINABLE):
+            return None
+        conn = db.get_connection()
         try:
-            yield conn
-            conn.commit()
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params if params is not None else ()).fetchall()
         except Exception as e:
-            conn.rollback()
-            print(f"Transaction Rolled Back: {e}")
-            raise e
+            return f"    (EXPLAIN failed: {e})"
         finally:
             conn.close()
+        return self.format_plan(rows)
 
-    def setup_tables(self):
-        # 1. Base Tables (Users)
-        create_schema = '''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_premium BOOLEAN DEFAULT 0
-        );
-        '''
-        self.executescript(create_schema)
+    @staticmethod
+    def format_plan(rows):
+        depth, lines = {0: 0}, []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append('    ' + '  ' * depth[node_id] + detail)
+        return '\\n'.join(lines)
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+
+    def report(self):
+        \"\"\"Per-shape statistics, most total time first.\"\"\"
+        with self.lock:
+            shapes = list(self.shapes.values())
+        report = [
+            {
+                'shape': stats.shape,
+                'count': stats.count,
+                'total_ms': stats.total * 1000,
+                'mean_ms': stats.total / stats.count * 1000,
+                'max_ms': stats.max * 1000,
+                'rows': stats.rows,
+                'slow': stats.slow,
+                'plan': stats.plan,
+            }
+            for stats in shapes
+        ]
+        report.sort(key=lambda row: row['total_ms'], reverse=True)
+        return report
+
+    def format_report(self, limit=20):
+        lines = [f"{'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>8} {'slow':>5}  query"]
+        for row in self.report()[:limit]:
+            lines.append(
+                f"{row['count']:>7} {row['total_ms']:>10.1f} {row['mean_ms']:>9.2f} {row['max_ms']:>9.2f} "
+                f"{row['rows']:>8} {row['slow']:>5}  {row['shape'][:120]}"
+            )
+        return '\\n'.join(lines)
+
+# Shared by the whole process
+query_log = QueryLog()
+"""
 
-        # 2. Triggers
-        create_trigger = '''
-        CREATE TRIGGER IF NOT EXISTS validate_email_suffix
-        BEFORE INSERT ON users
-        BEGIN
-            SELECT
-            CASE
-                WHEN NEW.email NOT LIKE '%@%' THEN
-                RAISE (ABORT, 'Invalid email address')
-            END;
-        END;
-        '''
-        self.executescript(create_trigger)
+AUDIT_PY = """
+import re
+import settings
+from core.db import Database
+from core.metrics import walk
+from nodes.model_node import ModelNode
 
-    # --- DDL & Schema Management ---
+class QueryAuditError(RuntimeError):
+    \"\"\"Raised by run_audit() in strict mode when the audit has findings.\"\"\"
 
-    def create_table(self, table_name, columns_def):
-        \"\"\"
-        Creates a table with given columns definition.
-        columns_def: str, e.g., "id INTEGER PRIMARY KEY, name TEXT"
-        \"\"\"
-        query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_def});"
-        self.execute(query)
+class Finding:
+    __slots__ = ('kind', 'subject', 'message', 'query', 'nodes', 'plan')
 
-    def alter_table(self, table_name, operation, details):
-        \"\"\"
-        Alters a table.
-        operation: 'ADD', 'RENAME', 'DROP' (Drop col not fully supported in old sqlite)
-        details: e.g., "COLUMN new_col TEXT"
-        \"\"\"
-        if operation.upper() == 'ADD':
-            query = f"ALTER TABLE {table_name} ADD {details};"
-        elif operation.upper() == 'RENAME':
-             query = f"ALTER TABLE {table_name} RENAME TO {details};"
-        else:
-            raise ValueError(f"Unsupported ALTER operation: {operation}")
-        self.execute(query)
+    def __init__(self, kind, subject, message, query=None, nodes=(), plan=None):
+        self.kind = kind # 'full_scan', 'temp_btree', 'unindexed_fk' or 'error'
+        self.subject = subject # table, clause (ORDER BY, ...) or column the finding is about
+        self.message = message
+        self.query = query
+        self.nodes = list(nodes)
+        self.plan = plan
 
-    def drop_table(self, table_name):
-        \"\"\"Drops a table if it exists.\"\"\"
-        query = f"DROP TABLE IF EXISTS {table_name};"
-        self.execute(query)
+    @property
+    def key(self):
+        return f"{self.kind}:{self.subject}"
 
-    def create_view(self, view_name, select_query):
-        \"\"\"Creates a view.\"\"\"
-        query = f"CREATE VIEW IF NOT EXISTS {view_name} AS {select_query};"
-        self.execute(query)
+    def __repr__(self):
+        return f"<Finding {self.key}>"
 
-    def drop_view(self, view_name):
-        \"\"\"Drops a view.\"\"\"
-        query = f"DROP VIEW IF EXISTS {view_name};"
-        self.execute(query)
+class QueryAudit:
+    \"\"\"
+    Checks the queries of every ModelNode in a graph against the live schema with
+    EXPLAIN QUERY PLAN, before the server takes traffic (settings.QUERY_AUDIT).
+
+    Flags:
+    - full_scan: a table read without an index ("SCAN users")
+    - temp_btree: a sort the planner has to build at query time ("USE TEMP B-TREE FOR ORDER BY")
+    - unindexed_fk: a foreign key column with no index starting with it (e.g. projects.user_id),
+      which makes joins, lookups by parent and ON DELETE CASCADE scan the child table
+    - error: a query that doesn't compile against the schema
+
+    Findings listed in QUERY_AUDIT['IGNORE'] as "kind" or "kind:subject"
+    (e.g. 'full_scan:users') are accepted and left out of the report.
+    \"\"\"
+    SCAN = re.compile(r"^SCAN (?:TABLE )?(\\w+)(?: AS \\w+)?$")
+    TEMP_BTREE = re.compile(r"^USE TEMP B-TREE FOR (.+)$")
+
+    def __init__(self, db=None, ignore=()):
+        self.db = db or Database()
+        self.ignore = set(ignore)
+
+    def queries(self, root):
+        \"\"\"{query: [node names]} for every ModelNode reachable from root.\"\"\"
+        queries = {}
+        for node, route, name in walk(root):
+            if isinstance(node, ModelNode):
+                queries.setdefault((node.query, len(node.params_mapping)), []).append(f"{route} {name}".strip())
+        return queries
+
+    def run(self, root):
+        findings = []
+        conn = self.db.get_connection()
+        try:
+            for (query, param_count), nodes in self.queries(root).items():
+                findings.extend(self.check_query(conn, query, param_count, nodes))
+            findings.extend(self.check_foreign_keys(conn))
+        finally:
+            conn.close()
+        return [finding for finding in findings if finding.kind not in self.ignore and finding.key not in self.ignore]
 
-    def create_index(self, index_name, table_name, columns, unique=False):
-        \"\"\"Creates an index.\"\"\"
-        unique_clause = "UNIQUE" if unique else ""
-        query = f"CREATE {unique_clause} INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns});"
-        self.execute(query)
+    def check_query(self, conn, query, param_count, nodes):
+        try:
+            # Parameters only bind values, so NULLs give the same plan
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", (None,) * param_count).fetchall()
+        except Exception as e:
+            return [Finding('error', 'query', f"EXPLAIN failed: {e}", query, nodes)]
+
+        plan = [row[3] for row in rows]
+        findings = []
+        for detail in plan:
+            match = self.SCAN.match(detail)
+            if match:
+                table = match.group(1)
+                hint = " (add an index on the filtered columns)" if re.search(r"\\bWHERE\\b", query, re.IGNORECASE) else ""
+                findings.append(Finding('full_scan', table, f"full table scan of {table}{hint}", query, nodes, plan))
+                continue
+            match = self.TEMP_BTREE.match(detail)
+            if match:
+                clause = match.group(1)
+                findings.append(Finding(
+                    'temp_btree', clause, f"sorts in a temp B-tree for {clause} (no index provides the order)",
+                    query, nodes, plan,
+                ))
+        return findings
+
+    def check_foreign_keys(self, conn):
+        findings = []
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            # Leading column of every index on the table, plus an INTEGER PRIMARY KEY (the rowid)
+            indexed = set()
+            for index in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+                columns = conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()
+                if columns:
+                    indexed.add(min(columns)[2])
+            for column in conn.execute(f"PRAGMA table_info('{table}')").fetchall():
+                if column[5] == 1 and column[2].upper() == 'INTEGER':
+                    indexed.add(column[1])
+
+            for fk in conn.execute(f"PRAGMA foreign_key_list('{table}')").fetchall():
+                column = fk[3]
+                if column not in indexed:
+                    findings.append(Finding(
+                        'unindexed_fk', f"{table}.{column}",
+                        f"foreign key {table}.{column} -> {fk[2]} has no index "
+                        f"(CREATE INDEX idx_{table}_{column} ON {table} ({column}))",
+                    ))
+        return findings
+
+    @staticmethod
+    def format_report(findings):
+        if not findings:
+            return "🔎 [Query Audit] No issues found."
+        lines = [f"🔎 [Query Audit] {len(findings)} issue(s):"]
+        for finding in findings:
+            lines.append(f"  - [{finding.key}] {finding.message}")
+            if finding.query:
+                lines.append(f"      query: {' '.join(finding.query.split())}")
+                lines.append(f"      nodes: {', '.join(finding.nodes)}")
+            if finding.plan:
+                lines.append(f"      plan: {' / '.join(finding.plan)}")
+        return '\\n'.join(lines)
+
+def run_audit(root, db=None):
+    \"\"\"
+    Audits the graph under root if QUERY_AUDIT['ENABLED']: prints the report, and
+    raises QueryAuditError in strict mode if anything was flagged. Returns the findings.
+    \"\"\"
+    config = getattr(settings, 'QUERY_AUDIT', {})
+    if not config.get('ENABLED', True):
+        return []
+    findings = QueryAudit(db, config.get('IGNORE', ())).run(root)
+    report = QueryAudit.format_report(findings)
+    if findings and config.get('STRICT', False):
+        raise QueryAuditError(report)
+    print(report)
+    return findings
 """
 
 MODEL_NODE_PY = """
 from nodes.base_node import BaseNode
 from core.db import Database
+from core.singleflight import SingleFlight
 
 class ModelNode(BaseNode):
     \"\"\"
     Model Component of MVC.
     Interacts with the Database.
+    With coalesce=True, concurrent requests running the same query with the same parameters
+    share one database round trip. A shared result may be up to one round trip old, so
+    coalescing is opt-in, and a request that already wrote through a ModelNode always
+    reads for itself (it must see its own write).
+    With stream=True, reads store a lazy row iterator instead of a list: rows are fetched
+    while the response is being sent (pair it with RenderNode(stream=True)).
     \"\"\"
-    def __init__(self, query, params_mapping=None, context_key='data', is_write=False):
+    # Shared by all ModelNodes, so identical reads from different branches coalesce too
+    reads = SingleFlight(timeout=10)
+    # Set in request.context by write nodes; later reads in the same request skip coalescing
+    WROTE_KEY = '_model_wrote'
+
+    def __init__(self, query, params_mapping=None, context_key='data', is_write=False, coalesce=False,
+                 stream=False):
         super().__init__()
         self.query = query
         self.params_mapping = params_mapping or [] # List of param keys to fetch from request
         self.context_key = context_key
         self.is_write = is_write
+        self.coalesce = coalesce
+        self.stream = stream
         self.db = Database()
 
     def process(self, request):
@@ -565,6 +3866,7 @@ class ModelNode(BaseNode):
         
         # 2. Execute Query
         if self.is_write:
+            request.context[self.WROTE_KEY] = True
             try:
                 if is_bulk:
                      self.db.executemany(self.query, query_params)
@@ -576,19 +3878,220 @@ class ModelNode(BaseNode):
                 request.context[f'{self.context_key}_success'] = True
             except Exception as e:
                 request.context['error'] = str(e)
+        elif self.stream:
+            request.context[self.context_key] = self.db.iterate(self.query, tuple(query_params))
         else:
-            results = self.db.fetchall(self.query, tuple(query_params))
+            results = self.fetch(tuple(query_params), coalesce=not request.context.get(self.WROTE_KEY))
             # Store in context
             request.context[self.context_key] = results
             
         return super().process(request)
+
+    def fetch(self, params, coalesce=True):
+        if self.coalesce and coalesce:
+            try:
+                key = (self.query, params)
+                hash(key)
+            except TypeError:
+                pass # unhashable params can't be a coalescing key
+            else:
+                # Each caller gets its own copy of the rows, so one request can't mutate another's
+                rows = self.reads.do(key, lambda: self.db.fetchall(self.query, params))
+                return [dict(row) for row in rows]
+        return self.db.fetchall(self.query, params)
+"""
+
+IP_FILTER_PY = """
+from nodes.base_node import BaseNode
+from core.response import Response
+from array import array
+from bisect import bisect_right
+import ipaddress
+import os
+import time
+import settings
+
+class CIDRSet:
+    \"\"\"
+    Immutable set of IPv4/IPv6 networks stored as sorted, merged intervals.
+    Each address family keeps two parallel arrays (range starts and range ends),
+    so membership is a single binary search: at most ~log2(ranges) comparisons,
+    which is never more than the address length in bits.
+    \"\"\"
+    def __init__(self, networks=()):
+        ranges = {4: [], 6: []}
+        for net in networks:
+            ranges[net.version].append((int(net.network_address), int(net.broadcast_address)))
+
+        # IPv4 fits in machine words; IPv6 needs Python ints.
+        self._starts = {4: array('L'), 6: []}
+        self._ends = {4: array('L'), 6: []}
+        self.size = 0
+
+        for version, items in ranges.items():
+            items.sort()
+            starts, ends = self._starts[version], self._ends[version]
+            for start, end in items:
+                if ends and start <= ends[-1] + 1:
+                    # Overlapping or adjacent range: extend the previous interval
+                    if end > ends[-1]:
+                        ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.size += len(starts)
+
+    def __contains__(self, ip):
+        \"\"\"
+        Accepts a string or an ipaddress object.
+        IPv4-mapped IPv6 addresses (::ffff:a.b.c.d) are matched as IPv4.
+        \"\"\"
+        if isinstance(ip, str):
+            try:
+                ip = ipaddress.ip_address(ip)
+            except ValueError:
+                return False
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+
+        starts = self._starts[ip.version]
+        value = int(ip)
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= self._ends[ip.version][index]
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_file(cls, path):
+        \"\"\"
+        Loads one network per line ('10.0.0.0/8', '2001:db8::/32' or a bare address).
+        Blank lines and '#' comments are ignored; invalid lines are skipped.
+        \"\"\"
+        networks = []
+        skipped = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    networks.append(ipaddress.ip_network(line, strict=False))
+                except ValueError:
+                    skipped += 1
+
+        if skipped:
+            print(f"⚠️ [Security] Skipped {skipped} invalid entries in {path}")
+        return cls(networks)
+
+class CIDRListFile:
+    \"\"\"
+    A CIDRSet backed by a file.
+    The file's mtime is polled at most once per interval and a changed file is
+    parsed into a brand new CIDRSet that replaces the old one in a single
+    assignment, so requests in flight never see a half-loaded list.
+    A missing file is treated as an empty list.
+    \"\"\"
+    def __init__(self, path, reload_interval=5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.networks = CIDRSet()
+        self._mtime = None
+        self._next_check = 0
+        self.reload()
+
+    def reload(self):
+        \"\"\"Re-reads the file if its mtime changed. Returns True when the list was swapped.\"\"\"
+        self._next_check = time.monotonic() + self.reload_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            mtime = None
+
+        if mtime == self._mtime:
+            return False
+
+        networks = CIDRSet()
+        if mtime is not None:
+            try:
+                networks = CIDRSet.from_file(self.path)
+            except OSError as e:
+                print(f"IP Filter Error: {e}")
+                return False
+
+        self.networks = networks
+        self._mtime = mtime
+        return True
+
+    def __contains__(self, ip):
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return ip in self.networks
+
+class IPFilterNode(BaseNode):
+    \"\"\"
+    Drops requests from blocklisted networks before any other work is done.
+    Config: SECURITY['IP_BLOCKLIST_FILE'] and SECURITY['IP_ALLOWLIST_FILE'].
+    Addresses in the allowlist always pass, even if a blocklisted range covers them.
+    Lists are reloaded automatically when their files change.
+
+    Place it directly after ServerNode: it only needs the client address, so
+    blocked requests are rejected before the request object is even built.
+    On the main line of the graph it also screens static files, which are served
+    before the graph runs (see ServerNode.screen).
+    \"\"\"
+    def __init__(self):
+        super().__init__()
+        interval = settings.SECURITY.get('IP_FILTER_RELOAD_INTERVAL', 5)
+        self.blocklist = CIDRListFile(settings.SECURITY.get('IP_BLOCKLIST_FILE'), interval)
+        self.allowlist = CIDRListFile(settings.SECURITY.get('IP_ALLOWLIST_FILE'), interval)
+        self.rejected = 0
+
+    def reload(self):
+        \"\"\"Forces both lists to be checked for changes now.\"\"\"
+        self.blocklist.reload()
+        self.allowlist.reload()
+
+    def check_connection(self, handler):
+        \"\"\"Returns a 403 Response if the client's network is blocked, else None.\"\"\"
+        if not settings.SECURITY.get('IP_FILTER_ENABLED', True):
+            return None
+
+        client_ip = handler.client_address[0]
+        try:
+            address = ipaddress.ip_address(client_ip)
+        except ValueError:
+            return None
+
+        if address in self.blocklist and address not in self.allowlist:
+            print(f"⚠️ [Security] Blocked Network: {client_ip}")
+            self.rejected += 1
+            # Closing the connection also discards any request body we never read
+            return Response(
+                "<h1>403 Forbidden</h1><p>Access from your network is not allowed.</p>",
+                status=403,
+                headers={'Connection': 'close'},
+            )
+        return None
+
+    def process(self, data):
+        # Works on both the raw handler and the request wrapper
+        rejection = self.check_connection(getattr(data, 'handler', data))
+        if rejection is not None:
+            return rejection
+        return super().process(data)
 """
 
 SECURITY_PY = """
 from nodes.base_node import BaseNode
+from core.response import Response
+import math
 import time
+import threading
 import settings
 import secrets
+import hmac
+import hashlib
 
 class RateLimitNode(BaseNode):
     \"\"\"
@@ -598,6 +4101,8 @@ class RateLimitNode(BaseNode):
     def __init__(self):
         super().__init__()
         self.ip_registry = {} # {ip: [timestamps]}
+        self.lock = threading.Lock() # requests from one IP run on concurrent threads
+        self.rejected = 0
 
     def process(self, request):
         if not settings.SECURITY.get('RATE_LIMIT_ENABLED', True):
@@ -611,47 +4116,155 @@ class RateLimitNode(BaseNode):
         window = settings.SECURITY.get('RATE_LIMIT_WINDOW', 10)
         limit = settings.SECURITY.get('RATE_LIMIT_MAX', 10)
         
-        history = self.ip_registry.get(client_ip, [])
-        # Keep only timestamps within validation window
-        history = [t for t in history if t > now - window]
-        
-        if len(history) >= limit:
+        with self.lock:
+            history = self.ip_registry.get(client_ip, [])
+            # Keep only timestamps within validation window
+            history = [t for t in history if t > now - window]
+
+            if len(history) >= limit:
+                self.ip_registry[client_ip] = history
+                self.rejected += 1
+                # A slot frees up when the oldest request in the window expires
+                retry_after = max(1, math.ceil(history[0] + window - now))
+            else:
+                # Add current request
+                history.append(now)
+                self.ip_registry[client_ip] = history
+                retry_after = None
+
+        if retry_after is not None:
             print(f"⚠️ [Security] Rate Limit Exceeded for {client_ip}")
-            return "<h1>429 Too Many Requests</h1><p>Please wait before trying again.</p>"
-        
-        # Add current request
-        history.append(now)
-        self.ip_registry[client_ip] = history
-        
+            return Response(
+                "<h1>429 Too Many Requests</h1><p>Please wait before trying again.</p>",
+                status=429,
+                headers={'Retry-After': retry_after},
+            )
+
         return super().process(request)
 
 class CSRFNode(BaseNode):
     \"\"\"
-    Protects against Cross-Site Request Forgery.
-    - Sets a CSRF cookie on GET.
-    - Validates CSRF token in Body on POST.
+    Protects against Cross-Site Request Forgery with stateless signed tokens.
+    - Issues a fresh token in request.context['csrf_token'] on every request.
+    - Validates the 'csrf_token' form field on POST. Tokens in the query string are
+      rejected (URLs end up in logs and Referer headers).
+
+    Token format: <nonce>.<timestamp>.<signature>
+    The signature is an HMAC-SHA256 (keyed from settings.SECRET_KEY) over what the token
+    is bound to, the nonce and the timestamp. A token is bound to:
+    - the session cookie (SECURITY['CSRF_SESSION_COOKIE']) when the client has one, or else
+    - the CSRF cookie (SECURITY['CSRF_COOKIE']): a signed random secret set on the first
+      response (double submit). A POST needs both the cookie and a token made for it, and a
+      cross-site page can neither read nor set the cookie.
+    Validation only recomputes HMACs and checks the age, so no token store is needed and
+    any worker or host that shares the SECRET_KEY can verify any token.
+
+    Config: SECURITY['CSRF_TOKEN_MAX_AGE'] (seconds), SECURITY['CSRF_SESSION_COOKIE'],
+    SECURITY['CSRF_COOKIE'], SECURITY['CSRF_COOKIE_AGE'] and SECURITY['CSRF_COOKIE_SECURE'].
     \"\"\"
+    def __init__(self):
+        super().__init__()
+        # Derived key, so CSRF signatures can never be replayed against other HMAC uses of SECRET_KEY
+        self.key = hmac.new(settings.SECRET_KEY.encode('utf-8'), b'webnode.csrf', hashlib.sha256).digest()
+        self.max_age = settings.SECURITY.get('CSRF_TOKEN_MAX_AGE', 3600)
+        self.session_cookie = settings.SECURITY.get('CSRF_SESSION_COOKIE', 'sessionid')
+        self.cookie_name = settings.SECURITY.get('CSRF_COOKIE', 'csrftoken')
+        self.cookie_age = settings.SECURITY.get('CSRF_COOKIE_AGE', 365 * 24 * 3600)
+        self.cookie_secure = settings.SECURITY.get('CSRF_COOKIE_SECURE', False)
+        self.rejected = 0
+
+    def hmac(self, message):
+        return hmac.new(self.key, message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def make_cookie(self):
+        secret = secrets.token_urlsafe(24)
+        return f"{secret}.{self.hmac(f'cookie|{secret}')}"
+
+    def cookie_secret(self, request):
+        \"\"\"The secret of a valid CSRF cookie sent with the request, or None.\"\"\"
+        secret, _, signature = request.cookies.get(self.cookie_name, '').partition('.')
+        if secret and hmac.compare_digest(self.hmac(f"cookie|{secret}"), signature):
+            return secret
+        return None
+
+    def binding(self, request):
+        \"\"\"What tokens for this request are bound to, or None if there is nothing to bind to.\"\"\"
+        session_id = request.cookies.get(self.session_cookie)
+        if session_id:
+            return f"session|{session_id}"
+        secret = self.cookie_secret(request)
+        return f"cookie|{secret}" if secret else None
+
+    def sign(self, binding, nonce, timestamp):
+        return self.hmac(f"{binding}|{nonce}|{timestamp}")
+
+    def make_token(self, binding):
+        nonce = secrets.token_urlsafe(12)
+        timestamp = str(int(time.time()))
+        return f"{nonce}.{timestamp}.{self.sign(binding, nonce, timestamp)}"
+
+    def validate_token(self, request, token):
+        binding = self.binding(request)
+        if not token or binding is None:
+            return False
+        parts = token.split('.')
+        if len(parts) != 3 or not parts[1].isdigit():
+            return False
+        nonce, timestamp, signature = parts
+
+        age = time.time() - int(timestamp)
+        if age > self.max_age or age < -60: # allow a little clock skew between hosts
+            return False
+
+        expected = self.sign(binding, nonce, timestamp)
+        return hmac.compare_digest(expected, signature)
+
+    def reject(self, request, reason):
+        print(f"⚠️ [Security] CSRF Validation Failed for {request.path} ({reason})")
+        self.rejected += 1
+        return Response("<h1>403 Forbidden</h1><p>CSRF Validation Failed.</p>", status=403)
+
     def process(self, request):
         if not settings.SECURITY.get('CSRF_ENABLED', True):
             return super().process(request)
-        
-        csrf_token = "secure-token-123" # In real app: secrets.token_hex(16)
-        
+
         if request.method == "POST":
-            submitted_token = request.get_param('csrf_token')
-            if submitted_token != csrf_token:
-                 print(f"⚠️ [Security] CSRF Mismatch: Expected {csrf_token}, Got {submitted_token}")
-                 return "<h1>403 Forbidden</h1><p>CSRF Validation Failed.</p>"
-        
-        # Pass token to context
-        request.context['csrf_token'] = csrf_token
-        
-        return super().process(request)
+            if 'csrf_token' in request.query:
+                return self.reject(request, "token in query string")
+            if not self.validate_token(request, request.get_param('csrf_token', source='form')):
+                return self.reject(request, "invalid token")
+
+        new_cookie = None
+        binding = self.binding(request)
+        if binding is None:
+            new_cookie = self.make_cookie()
+            # Nodes after this one (CacheNode vary_cookies) see the cookie as if the client had sent it
+            request.cookies[self.cookie_name] = new_cookie
+            binding = self.binding(request)
+
+        # Pass a fresh token to context
+        request.context['csrf_token'] = self.make_token(binding)
+
+        result = super().process(request)
+        if new_cookie is None:
+            return result
+
+        response = Response.coerce(result)
+        if response is not None:
+            attributes = f"Path=/; Max-Age={self.cookie_age}; HttpOnly; SameSite=Lax"
+            if self.cookie_secure:
+                attributes += "; Secure"
+            response.add_header('Set-Cookie', f"{self.cookie_name}={new_cookie}; {attributes}")
+        return response
 
 class AntiBotNode(BaseNode):
     \"\"\"
     Blocks Basic Bots and Scrapers.
     \"\"\"
+    def __init__(self):
+        super().__init__()
+        self.rejected = 0
+
     def process(self, request):
         if not settings.SECURITY.get('ANTI_SCRAPING_ENABLED', True):
             return super().process(request)
@@ -662,7 +4275,8 @@ class AntiBotNode(BaseNode):
         bot_keywords = ['curl', 'wget', 'python-requests', 'scrapy', 'bot', 'spider', 'crawler']
         if any(keyword in user_agent for keyword in bot_keywords):
              print(f"⚠️ [Security] Bot Detected: {user_agent}")
-             return "<h1>403 Forbidden</h1><p>No Bots Allowed.</p>"
+             self.rejected += 1
+             return Response("<h1>403 Forbidden</h1><p>No Bots Allowed.</p>", status=403)
         
         if 'Accept-Language' not in request.headers:
              print(f"⚠️ [Security] Suspicious Headers (No Accept-Language)")
@@ -674,7 +4288,22 @@ class ScreenProtectionNode(BaseNode):
     \"\"\"
     Injects "Computer Vision Blocking" scripts and styles.
     Prevents selection, right-click, and overlays on blur.
+
+    The script is not spliced into every response. The node hands it to
+    RenderNode, which injects it once into the compiled template, so rendered
+    pages cost nothing extra per request. Only responses built without
+    RenderNode fall back to the </body> search.
+
+    Per-route control:
+    - include_paths: only these paths are protected (opt-in).
+    - exclude_paths: these paths are never protected (opt-out).
+    - RenderNode(..., screen_protection=False) opts a single view out.
     \"\"\"
+    def __init__(self, include_paths=None, exclude_paths=None):
+        super().__init__()
+        self.include_paths = set(include_paths) if include_paths is not None else None
+        self.exclude_paths = set(exclude_paths or ())
+
     PROTECTION_SCRIPT = \"\"\"
     <style>
         body {
@@ -717,11 +4346,20 @@ class ScreenProtectionNode(BaseNode):
         if not settings.SECURITY.get('SCREEN_PROTECTION_ENABLED', True):
             return super().process(request)
         
+        if request.path in self.exclude_paths or (
+            self.include_paths is not None and request.path not in self.include_paths
+        ):
+            return super().process(request)
+
+        # RenderNode picks this up and clears it once the snippet is in the template
+        request.screen_protection = self.PROTECTION_SCRIPT
         response_content = super().process(request)
-        
-        if isinstance(response_content, str) and "</body>" in response_content:
-            return response_content.replace("</body>", self.PROTECTION_SCRIPT + "</body>")
-            
+
+        if request.screen_protection is not None:
+            request.screen_protection = None
+            if isinstance(response_content, str) and "</body>" in response_content:
+                return response_content.replace("</body>", self.PROTECTION_SCRIPT + "</body>")
+
         return response_content
 """
 
@@ -751,7 +4389,7 @@ class ActionLoggerNode(BaseNode):
             client_ip = request.handler.client_address[0]
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             method = request.method
-            path = request.path
+            path = request.full_path
             user_agent = request.headers.get('User-Agent', 'Unknown')
             
             log_entry = f"[{timestamp}] {method} {path} | UA: {user_agent}\\n"
@@ -998,6 +4636,7 @@ TEMPLATE_INDEX_HTML = """<!DOCTYPE html>
             <p class="subtitle">Enter a number to find out.</p>
 
             <form method="POST" action="/">
+                <input type="hidden" name="csrf_token" value="{csrf_token}">
                 <div class="input-group">
                     <input type="number" name="number" placeholder="e.g., 42" required>
                 </div>
@@ -1024,21 +4663,26 @@ TEMPLATE_INDEX_HTML = """<!DOCTYPE html>
 MAIN_PY = """import socketserver
 import sys
 import os
+import time
 import settings
 from nodes.server_node import FrameworkHandler, ServerNode
 from nodes.base_node import BaseNode
 from nodes.http_requests_node import HTTPRequestsNode
 from nodes.url_node import URLNode
-from nodes.logic_node import LogicNode
+from nodes.logic_node import LogicNode, MemoizedLogicNode
 from nodes.context_node import ContextNode
 from nodes.template_node import RenderNode
 from nodes.route_node import RouterNode
 from nodes.model_node import ModelNode
 from nodes.model_node import ModelNode
+from nodes.cache_node import CacheNode
+from nodes.parallel_node import ParallelNode
 from core.db import Database
+from core.audit import run_audit
 from static.logic import check_odd_even, weather_logic, time_logic
 from plugins.security import RateLimitNode, CSRFNode, AntiBotNode, ScreenProtectionNode
 from plugins.logger import ActionLoggerNode
+from plugins.ip_filter import IPFilterNode
 
 # --- Initialize Database ---
 db = Database()
@@ -1051,6 +4695,8 @@ try:
     
     # 2. Create Index on User Email for speed (if not exists)
     db.create_index("idx_user_email", "users", "email", unique=True)
+    # ...and on the foreign key, so lookups by user and ON DELETE CASCADE don't scan projects
+    db.create_index("idx_projects_user_id", "projects", "user_id")
     
     # 3. Create a View for Premium Users
     db.create_view("v_premium_users", "SELECT * FROM users WHERE is_premium = 1")
@@ -1083,6 +4729,18 @@ def format_user_list(request):
             html += f'<div class="user-item"><span>{user["name"]} {premium}</span> <span style="color: #666;">{user["email"]}</span></div>'
     return {'user_list_html': html}
 
+def stream_user_list(request):
+    # Streaming variant: each row is formatted and sent as the database yields it
+    def rows(users):
+        empty = True
+        for user in users:
+            empty = False
+            premium = "⭐" if user.get('is_premium') else ""
+            yield f'<div class="user-item"><span>{user["name"]} {premium}</span> <span style="color: #666;">{user["email"]}</span></div>'
+        if empty:
+            yield "<p>No users found.</p>"
+    return {'user_list_html': rows(request.context.get('users', []))}
+
 # --- Node Graph Construction ---
 
 # 1. Server & Request
@@ -1093,29 +4751,40 @@ http_request_node = HTTPRequestsNode()
 
 # --- HOME BRANCH ---
 url_index = URLNode('/')
+# Page cache: GETs are served from memory for 5s, then stale for up to 30s while one refresh runs.
+# The page embeds a CSRF token bound to the session cookie, or to the CSRF cookie that CSRFNode
+# sets on a first visit, so the cache varies on both: every visitor gets a page with their own token.
+cache_index = CacheNode(ttl=5, stale_ttl=30, vary_cookies=[
+    settings.SECURITY.get('CSRF_SESSION_COOKIE', 'sessionid'),
+    settings.SECURITY.get('CSRF_COOKIE', 'csrftoken'),
+])
 logic_index = LogicNode(index_logic)
 # Dummy widgets
 logic_r1 = LogicNode(lambda r: {'r1': ''}) 
-node_weather = LogicNode(weather_logic)
-node_time = LogicNode(time_logic)
+# Memoized widgets: weather never changes, the clock changes once per second
+node_weather = MemoizedLogicNode(weather_logic)
+node_time = MemoizedLogicNode(time_logic, key_func=lambda r: int(time.time()), max_entries=2)
+# Widgets don't depend on each other: run them side by side
+widgets = ParallelNode([node_weather, node_time])
 render_index = RenderNode('index.html')
 
 # Wiring Home
-url_index.connect(logic_index).connect(logic_r1).connect(node_weather).connect(node_time).connect(render_index)
+url_index.connect(cache_index).connect(logic_index).connect(logic_r1).connect(widgets).connect(render_index)
 
 
 # --- USER MANAGER BRANCH (MVC) ---
 # GET /users
 url_users = URLNode('/users')
-# Model: Fetch all users
+# Model: Fetch all users (streamed: rows are read while the page is being sent)
 model_fetch_users = ModelNode(
     query="SELECT * FROM users ORDER BY id DESC",
-    context_key='users'
+    context_key='users',
+    stream=True
 )
 # Controller/Logic: Format data for view
-logic_format_users = LogicNode(format_user_list)
-# View: Render Template
-render_users = RenderNode('users.html')
+logic_format_users = LogicNode(stream_user_list)
+# View: Render Template (chunked: the page head goes out before the rows)
+render_users = RenderNode('users.html', stream=True)
 
 url_users.connect(model_fetch_users).connect(logic_format_users).connect(render_users)
 
@@ -1148,7 +4817,8 @@ router_node = RouterNode([url_index, url_users, url_add_user])
 
 # 4. Connect Main Line
 # 1.5 Security Middleware Chain
-# Request -> Logger -> AntiBot -> RateLimit -> CSRF -> ScreenProtection -> Router
+# IPFilter -> Request -> Logger -> AntiBot -> RateLimit -> CSRF -> ScreenProtection -> Router
+security_ipfilter = IPFilterNode()
 action_logger = ActionLoggerNode()
 security_antibot = AntiBotNode()
 security_ratelimit = RateLimitNode()
@@ -1158,8 +4828,11 @@ security_screen = ScreenProtectionNode()
 # ... (Routes) ...
 
 # 4. Connect Main Line
-# New Chain: Server -> Request -> [Logger] -> [Security] -> Router
-server_node.connect(http_request_node).connect(action_logger).connect(security_antibot).connect(security_ratelimit).connect(security_csrf).connect(security_screen).connect(router_node)
+# New Chain: Server -> [IP Filter] -> Request -> [Logger] -> [Security] -> Router
+server_node.connect(security_ipfilter).connect(http_request_node).connect(action_logger).connect(security_antibot).connect(security_ratelimit).connect(security_csrf).connect(security_screen).connect(router_node)
+
+# 5. Check every ModelNode query against the schema (settings.QUERY_AUDIT; strict mode stops here)
+run_audit(server_node)
 
 if __name__ == "__main__":
     PORT = settings.PORT
@@ -1173,9 +4846,11 @@ if __name__ == "__main__":
     print("  POST /add_user (Add User - MVC Demo)")
     print("  * RDBMS Features Active: Triggers, Transactions, Stored Procs, FKs, DDL *")
     
-    socketserver.TCPServer.allow_reuse_address = True
+    # Threaded: keep-alive connections and streamed responses don't block other clients
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    socketserver.ThreadingTCPServer.daemon_threads = True
     try:
-        with socketserver.TCPServer(("", PORT), FrameworkHandler) as httpd:
+        with socketserver.ThreadingTCPServer(("", PORT), FrameworkHandler) as httpd:
             httpd.serve_forever()
     except KeyboardInterrupt:
         httpd.server_close()
@@ -1208,11 +4883,12 @@ def create_project(project_name):
     write_file(os.path.join(base_path, "plugins", "__init__.py"), "")
     write_file(os.path.join(base_path, "plugins", "security.py"), SECURITY_PY)
     write_file(os.path.join(base_path, "plugins", "logger.py"), LOGGER_PY)
+    write_file(os.path.join(base_path, "plugins", "ip_filter.py"), IP_FILTER_PY)
 
     # Write Nodes
     write_file(os.path.join(base_path, "nodes", "__init__.py"), "")
-    write_file(os.path.join("nodes", "base_node.py"), BASE_NODE_PY)
-    write_file(os.path.join("nodes", "server_node.py"), SERVER_NODE_PY)
+    write_file(os.path.join(base_path, "nodes", "base_node.py"), BASE_NODE_PY)
+    write_file(os.path.join(base_path, "nodes", "server_node.py"), SERVER_NODE_PY)
     write_file(os.path.join(base_path, "nodes", "http_requests_node.py"), HTTP_REQUESTS_NODE_PY)
     write_file(os.path.join(base_path, "nodes", "context_node.py"), CONTEXT_NODE_PY)
     write_file(os.path.join(base_path, "nodes", "logic_node.py"), LOGIC_NODE_PY)
@@ -1222,10 +4898,30 @@ def create_project(project_name):
     
     # Write Core
     write_file(os.path.join(base_path, "core", "db.py"), DB_PY)
+    write_file(os.path.join(base_path, "core", "static_files.py"), STATIC_FILES_PY)
+    write_file(os.path.join(base_path, "core", "compression.py"), COMPRESSION_PY)
+    write_file(os.path.join(base_path, "core", "cache.py"), CACHE_PY)
+    write_file(os.path.join(base_path, "core", "singleflight.py"), SINGLEFLIGHT_PY)
+    write_file(os.path.join(base_path, "core", "multipart.py"), MULTIPART_PY)
+    write_file(os.path.join(base_path, "core", "response.py"), RESPONSE_PY)
+    write_file(os.path.join(base_path, "core", "metrics.py"), METRICS_PY)
+    write_file(os.path.join(base_path, "core", "tracing.py"), TRACING_PY)
+    write_file(os.path.join(base_path, "core", "profiling.py"), PROFILING_PY)
+    write_file(os.path.join(base_path, "core", "query_log.py"), QUERY_LOG_PY)
+    write_file(os.path.join(base_path, "core", "audit.py"), AUDIT_PY)
     
     # Write Model Node
     write_file(os.path.join(base_path, "nodes", "model_node.py"), MODEL_NODE_PY)
 
+    # Write Cache Node
+    write_file(os.path.join(base_path, "nodes", "cache_node.py"), CACHE_NODE_PY)
+
+    # Write Parallel Node
+    write_file(os.path.join(base_path, "nodes", "parallel_node.py"), PARALLEL_NODE_PY)
+
+    # Write Process Node
+    write_file(os.path.join(base_path, "nodes", "process_node.py"), PROCESS_NODE_PY)
+
     # Write Static Files
     write_file(os.path.join(base_path, "static", "logic.py"), STATIC_LOGIC_PY)
     write_file(os.path.join(base_path, "static", "style.css"), STATIC_STYLE_CSS)
@@ -1255,10 +4951,79 @@ def main():
     startproject_parser = subparsers.add_parser('startproject', help='Create a new WebNode project')
     startproject_parser.add_argument('name', help='Name of the project directory')
 
+    # collectstatic command
+    collectstatic_parser = subparsers.add_parser('collectstatic', help='Build fingerprinted, minified and precompressed static files')
+    collectstatic_parser.add_argument('--source', default='static', help='Static source directory (default: static)')
+    collectstatic_parser.add_argument('--output', default='static_build', help='Build directory, matches settings.STATIC_BUILD_ROOT (default: static_build)')
+    collectstatic_parser.add_argument('--no-minify', action='store_true', help='Copy CSS/JS without minifying')
+
+    # bench command
+    bench_parser = subparsers.add_parser('bench', help='Load test a running server or an in-process graph')
+    target = bench_parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://127.0.0.1:8000', help='Server to drive (default: http://127.0.0.1:8000)')
+    target.add_argument('--app', nargs='?', const='main:server_node', help='Serve module:attribute from the current directory in-process instead (default: main:server_node)')
+    bench_parser.add_argument('-r', '--request', action='append', dest='requests', metavar='SPEC',
+                              help='"[WEIGHT*]METHOD PATH [FORM_BODY]", repeatable; {n} becomes a unique number (default: "GET /")')
+    bench_parser.add_argument('-c', '--concurrency', type=int, default=10, help='Concurrent clients (default: 10)')
+    bench_parser.add_argument('-d', '--duration', type=float, default=10.0, help='Measured seconds (default: 10)')
+    bench_parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds before that (default: 1)')
+    bench_parser.add_argument('--no-keepalive', action='store_true', help='Open a new connection for every request')
+    bench_parser.add_argument('--csrf-from', metavar='PATH', help='Page to take a csrf_token from for POST requests, e.g. /users')
+    bench_parser.add_argument('-H', '--header', action='append', default=[], metavar='"Name: value"', help='Extra request header, repeatable')
+    bench_parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds (default: 30)')
+    bench_parser.add_argument('--seed', type=int, default=0, help='Seed for the request mix (default: 0)')
+    bench_parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    bench_parser.add_argument('-o', '--output', help='Also write the JSON result to this file')
+
+    # microbench command
+    microbench_parser = subparsers.add_parser('microbench', help='Time framework primitives; save or compare against a JSON baseline')
+    microbench_parser.add_argument('--project', help='Project to import the framework from (default: a freshly generated one)')
+    microbench_parser.add_argument('-k', '--filter', metavar='REGEX', help='Only run benchmarks whose name matches')
+    microbench_parser.add_argument('--budget', type=float, default=0.5, help='Seconds spent per benchmark (default: 0.5)')
+    microbench_parser.add_argument('--save', metavar='FILE', help='Write the results as a baseline JSON file')
+    microbench_parser.add_argument('--compare', metavar='FILE', help='Compare with a baseline; exit 1 on regressions')
+    microbench_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help=f'Allowed slowdown before failing (default: {DEFAULT_THRESHOLD})')
+    microbench_parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+
     args = parser.parse_args()
 
     if args.command == 'startproject':
         create_project(args.name)
+    elif args.command == 'collectstatic':
+        try:
+            collect_static(args.source, args.output, minify=not args.no_minify)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    elif args.command == 'bench':
+        try:
+            headers = {}
+            for header in args.header:
+                name, sep, value = header.partition(':')
+                if not sep or not name.strip():
+                    raise ValueError(f"Header must look like 'Name: value', got {header!r}")
+                headers[name] = value
+            run_bench(
+                url=args.url, app=args.app, output=args.output, as_json=args.json,
+                specs=args.requests or ['GET /'], concurrency=args.concurrency, duration=args.duration,
+                warmup=args.warmup, keepalive=not args.no_keepalive, csrf_from=args.csrf_from,
+                headers={name.strip(): value.strip() for name, value in headers.items()},
+                timeout=args.timeout, seed=args.seed,
+            )
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    elif args.command == 'microbench':
+        if args.list:
+            from webnode.microbench import BENCHMARKS
+            for name, _, _ in BENCHMARKS:
+                print(name)
+            return
+        try:
+            sys.exit(run_microbench(args.project, args.filter, args.budget, args.save, args.compare, args.threshold))
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
     else:
         parser.print_help()
 
@@ -0,0 +1,235 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import shutil
+
+# --- Build settings ---
+
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+SKIP_DIRS = {'__pycache__'}
+SKIP_EXTENSIONS = {'.py', '.pyc', '.gz'} # app code lives in static/ too; never publish it
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.mjs', '.html', '.svg', '.json', '.txt', '.xml', '.map'}
+
+# --- Minifiers ---
+
+CSS_TOKENS = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'   # 1: strings, kept verbatim
+    r'|(/\*.*?\*/)'                               # 2: comments, dropped
+    r'|\s*;\s*(\})\s*'                            # 3: ';' before '}', dropped
+    r'|\s*([{};,>])\s*'                           # 4: punctuation, surrounding space dropped
+    r'|(\s+)',                                    # 5: any other whitespace, collapsed
+    re.S,
+)
+
+def minify_css(source):
+    """
+    Removes comments and redundant whitespace from a stylesheet.
+    String literals are left untouched; spaces around ':' are kept because
+    they are significant in selectors (`a :hover` != `a:hover`).
+    """
+    def replace(match):
+        string, comment, closing, punct, space = match.groups()
+        if string is not None:
+            return string
+        if comment is not None:
+            return ''
+        if closing is not None:
+            return closing
+        if punct is not None:
+            return punct
+        return ' '
+    return CSS_TOKENS.sub(replace, source).strip()
+
+JS_PUNCTUATION = set('{}()[];,:=<>!?&|*%^~')
+JS_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+
+def minify_js(source):
+    """
+    Conservative JavaScript minifier (JSMin-style).
+    - Drops comments and collapses whitespace outside of strings, template literals and regexes.
+    - Keeps one newline wherever a newline was, so automatic semicolon insertion is unaffected.
+    - Never joins '+'/'-' tokens (`a - -b` stays valid).
+    """
+    NEWLINE, SPACE = object(), object() # collapsed whitespace markers
+    tokens = []
+    i, n = 0, len(source)
+
+    def last_significant():
+        for token in reversed(tokens):
+            if token is not NEWLINE and token is not SPACE:
+                return token[-1]
+        return ''
+
+    while i < n:
+        c = source[i]
+
+        if c in '"\'`':
+            # String or template literal: copy through the matching quote
+            j = i + 1
+            while j < n and source[j] != c:
+                j += 2 if source[j] == '\\' else 1
+            tokens.append(source[i:j + 1])
+            i = j + 1
+        elif source.startswith('//', i):
+            j = source.find('\n', i)
+            i = n if j == -1 else j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            i = n if j == -1 else j + 2
+            tokens.append(SPACE)
+        elif c == '/' and (not last_significant() or last_significant() in JS_REGEX_PREFIX):
+            # Regex literal: copy through the closing '/', honouring escapes and [classes]
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            tokens.append(source[i:j + 1])
+            i = j + 1
+        elif c.isspace():
+            j = i
+            while j < n and source[j].isspace():
+                j += 1
+            tokens.append(NEWLINE if '\n' in source[i:j] else SPACE)
+            i = j
+        else:
+            tokens.append(c)
+            i += 1
+
+    # Emit whitespace only where it separates two tokens that need it
+    result = []
+    pending = None
+    for token in tokens:
+        if token is NEWLINE or token is SPACE:
+            if pending is not NEWLINE:
+                pending = token
+            continue
+        if pending is not None and result:
+            before, after = result[-1][-1], token[0]
+            if pending is NEWLINE:
+                result.append('\n')
+            elif before not in JS_PUNCTUATION and after not in JS_PUNCTUATION:
+                result.append(' ')
+        pending = None
+        result.append(token)
+    return ''.join(result)
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+    '.mjs': minify_js,
+}
+
+# --- Pipeline ---
+
+def fingerprint(relative_path, content):
+    root, ext = os.path.splitext(relative_path)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f"{root}.{digest}{ext}"
+
+def write_output(output_dir, relative_path, content, precompress):
+    path = os.path.join(output_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    if precompress:
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            with open(path + '.gz', 'wb') as f:
+                f.write(compressed)
+
+def is_within(path, directory):
+    return os.path.commonpath([path, directory]) == directory
+
+def is_build_dir(output_dir):
+    """True if output_dir holds a manifest written by collect_static (so clearing it loses nothing else)."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(manifest, dict) and 'version' in manifest and isinstance(manifest.get('files'), dict)
+
+def clear_output(source_dir, output_dir):
+    """
+    Deletes a previous build in output_dir. Refuses (ValueError) when output_dir is, or contains,
+    the source directory or the working directory, or when it was not created by collect_static.
+    """
+    output = os.path.realpath(output_dir)
+    for name, path in (('source directory', source_dir), ('current directory', os.getcwd())):
+        if is_within(os.path.realpath(path), output):
+            raise ValueError(f"Refusing to clear '{output_dir}': it contains the {name}.")
+    if not os.listdir(output):
+        return
+    if not is_build_dir(output):
+        raise ValueError(
+            f"Refusing to clear '{output_dir}': it has no {MANIFEST_NAME} from a previous collectstatic. "
+            f"Remove it yourself or choose another output directory."
+        )
+    shutil.rmtree(output)
+
+def collect_static(source_dir, output_dir, minify=True, clear=True):
+    """
+    Processes source_dir into output_dir:
+    - CSS/JS are minified.
+    - Every file is written under its original name and a content-hashed name (style.<hash>.css).
+    - Text assets get a .gz sibling compressed at level 9.
+    - manifest.json maps original relative paths to hashed ones (used by RenderNode).
+    With clear=True a previous build in output_dir is deleted first (see clear_output).
+    Returns the manifest dict.
+    """
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"Static directory '{source_dir}' does not exist.")
+
+    if clear and os.path.isdir(output_dir):
+        clear_output(source_dir, output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {}
+    saved = 0
+
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for filename in sorted(filenames):
+            ext = os.path.splitext(filename)[1].lower()
+            if filename.startswith('.') or ext in SKIP_EXTENSIONS:
+                continue
+
+            source_path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(source_path, source_dir).replace(os.sep, '/')
+
+            with open(source_path, 'rb') as f:
+                content = f.read()
+
+            if minify and ext in MINIFIERS:
+                try:
+                    minified = MINIFIERS[ext](content.decode('utf-8')).encode('utf-8')
+                    saved += len(content) - len(minified)
+                    content = minified
+                except UnicodeDecodeError:
+                    pass
+
+            hashed_path = fingerprint(relative_path, content)
+            precompress = ext in PRECOMPRESS_EXTENSIONS
+            write_output(output_dir, relative_path, content, precompress)
+            write_output(output_dir, hashed_path, content, precompress)
+
+            manifest[relative_path] = hashed_path
+            print(f"Collected: {relative_path} -> {hashed_path}")
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': manifest}, f, indent=2, sort_keys=True)
+
+    print(f"\n{len(manifest)} files collected into {output_dir} ({saved} bytes saved by minification).")
+    return manifest
@@ -0,0 +1,340 @@
+import io
+import os
+import re
+import sys
+import copy
+import json
+import time
+import shutil
+import platform
+import tempfile
+import itertools
+import contextlib
+import statistics
+import http.client
+
+# --- Settings ---
+
+BASELINE_VERSION = 1
+DEFAULT_THRESHOLD = 0.10 # compare fails when a benchmark is more than 10% slower (and beyond its noise)
+MIN_LOOP_TIME = 0.05 # seconds; calibration grows `number` until one loop takes this long
+MIN_REPEATS = 5
+
+BENCHMARKS = [] # (name, params, factory), in definition order
+
+def benchmark(name, **grid):
+    """
+    Registers a benchmark factory, once per combination of the parameter lists in grid:
+        @benchmark('router.dispatch', routes=[10, 100])  ->  router.dispatch[routes=10], ...
+    The factory gets (env, **params) and returns the operation to time, or a dict
+    {'op': callable, 'reset': callable run untimed before each repeat, 'number': fixed ops per repeat}.
+    """
+    def register(factory):
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            params = dict(zip(keys, values))
+            label = ','.join(f"{key}={value}" for key, value in params.items())
+            BENCHMARKS.append((f"{name}[{label}]" if label else name, params, factory))
+        return factory
+    return register
+
+# --- Environment ---
+
+class Environment:
+    """
+    A WebNode project to import the framework modules from, plus a scratch directory.
+    Without a project path, a fresh project is generated from this package (so changes to
+    the framework sources are what gets measured). Settings changed with patch() are restored on close.
+    """
+    def __init__(self, project=None):
+        self.scratch = tempfile.mkdtemp(prefix='webnode-bench-')
+        self.previous_cwd = os.getcwd()
+        if project is None:
+            from webnode.cli import create_project
+            os.chdir(self.scratch)
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_project('project')
+            project = os.path.join(self.scratch, 'project')
+        self.project = os.path.abspath(project)
+        if not os.path.isdir(os.path.join(self.project, 'nodes')):
+            raise FileNotFoundError(f"'{self.project}' is not a WebNode project (no nodes/ directory)")
+        os.chdir(self.project)
+        sys.path.insert(0, self.project)
+        self.patches = []
+
+    def patch(self, target, name, value):
+        """Sets target[name] (dict) or target.name (object) until close()."""
+        if isinstance(target, dict):
+            self.patches.append((target, name, target.get(name), name in target))
+            target[name] = value
+        else:
+            self.patches.append((target, name, getattr(target, name, None), hasattr(target, name)))
+            setattr(target, name, value)
+
+    def path(self, *parts):
+        return os.path.join(self.scratch, *parts)
+
+    def close(self):
+        for target, name, value, existed in reversed(self.patches):
+            if isinstance(target, dict):
+                if existed:
+                    target[name] = value
+                else:
+                    target.pop(name, None)
+            elif existed:
+                setattr(target, name, value)
+            else:
+                delattr(target, name)
+        os.chdir(self.previous_cwd)
+        if self.project in sys.path:
+            sys.path.remove(self.project)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+class FakeHandler:
+    """The parts of FrameworkHandler that RequestWrapper and the nodes read."""
+    def __init__(self, method='GET', path='/', headers=None, body=b'', client_ip='127.0.0.1'):
+        self.command = method
+        self.path = path
+        raw = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        self.headers = http.client.parse_headers(io.BytesIO(raw.encode('latin-1') + b'\r\n'))
+        self.rfile = io.BytesIO(body)
+        self.client_address = (client_ip, 50000)
+        self.close_connection = False
+
+# --- Benchmarks ---
+
+@benchmark('router.dispatch', routes=[10, 100, 1000])
+def bench_router(env, routes):
+    from nodes.route_node import RouterNode
+    from nodes.url_node import URLNode
+    from nodes.http_requests_node import RequestWrapper
+
+    router = RouterNode([URLNode(f"/page/{i}") for i in range(routes)])
+    # The last route: the worst case for a linear scan
+    request = RequestWrapper(FakeHandler(path=f"/page/{routes - 1}"))
+    return lambda: router.process(request)
+
+@benchmark('render', size=['1KB', '16KB', '128KB'], keys=[5, 50])
+def bench_render(env, size, keys):
+    import settings
+    from nodes.template_node import RenderNode
+
+    directory = env.path('templates')
+    os.makedirs(directory, exist_ok=True)
+    env.patch(settings, 'TEMPLATES_DIR', directory)
+
+    target = int(size[:-2]) * 1024
+    filler = "<p>WebNode renders templates by replacing placeholders.</p>\n"
+    chunk = filler * max(1, target // (len(filler) * keys))
+    template = "<html><body>\n" + ''.join(f"{chunk}<div>{{key_{i}}}</div>\n" for i in range(keys)) + "</body></html>"
+    name = f"bench_{size}_{keys}.html"
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        f.write(template)
+
+    context = {f"key_{i}": f"value {i}" for i in range(keys)}
+    RenderNode.render(name, dict(context)) # compile and cache outside the timing
+    return lambda: RenderNode.render(name, dict(context))
+
+@benchmark('request.parse', body=['query', 'form', 'multipart'])
+def bench_request_parse(env, body):
+    from nodes.http_requests_node import RequestWrapper
+
+    headers = {
+        'Host': 'localhost',
+        'User-Agent': 'Mozilla/5.0',
+        'Cookie': 'sessionid=abc123; theme=dark; lang=en',
+    }
+    path, payload = '/search', b''
+    if body == 'query':
+        path = '/search?' + '&'.join(f"field{i}=value{i}" for i in range(20))
+    elif body == 'form':
+        payload = '&'.join(f"field{i}=value+{i}" for i in range(20)).encode()
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    else:
+        boundary = 'webnodebenchboundary'
+        parts = [
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"field{i}\"\r\n\r\nvalue {i}\r\n".encode()
+            for i in range(10)
+        ]
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"upload\"; filename=\"a.txt\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n".encode() + b"x" * 16384 + b"\r\n"
+        )
+        payload = b''.join(parts) + f"--{boundary}--\r\n".encode()
+        headers['Content-Type'] = f"multipart/form-data; boundary={boundary}"
+    headers['Content-Length'] = str(len(payload))
+
+    # Header parsing belongs to http.server, not the framework: done once
+    template = FakeHandler('POST' if payload else 'GET', path, headers)
+
+    def op():
+        handler = copy.copy(template)
+        handler.rfile = io.BytesIO(payload)
+        request = RequestWrapper(handler)
+        request.get_param('field3')
+        request.cookies
+        request.close()
+    return op
+
+@benchmark('ratelimit', ips=[100, 10000, 100000])
+def bench_ratelimit(env, ips):
+    import settings
+    from plugins.security import RateLimitNode
+    from nodes.http_requests_node import RequestWrapper
+
+    env.patch(settings.SECURITY, 'RATE_LIMIT_ENABLED', True)
+    env.patch(settings.SECURITY, 'RATE_LIMIT_WINDOW', 60)
+    env.patch(settings.SECURITY, 'RATE_LIMIT_MAX', 10 ** 9) # measure bookkeeping, not rejections
+    node = RateLimitNode()
+    requests = [RequestWrapper(FakeHandler(client_ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")) for i in range(ips)]
+    now = time.time()
+    history = [now - 30 + i for i in range(10)] # 10 requests in the window per IP
+    cursor = itertools.cycle(requests)
+
+    def reset():
+        node.ip_registry = {request.handler.client_address[0]: list(history) for request in requests}
+
+    # One repeat = one request from every IP, so each history grows by exactly one
+    return {'op': lambda: node.process(next(cursor)), 'reset': reset, 'number': ips}
+
+@benchmark('logger.log')
+def bench_logger(env):
+    import settings
+    from plugins.logger import ActionLoggerNode
+    from nodes.http_requests_node import RequestWrapper
+
+    env.patch(settings.LOGGING, 'ENABLED', True)
+    node = ActionLoggerNode()
+    node.log_dir = env.path('logs')
+    os.makedirs(node.log_dir, exist_ok=True)
+    request = RequestWrapper(FakeHandler(path='/users?page=2', headers={'User-Agent': 'Mozilla/5.0'}))
+    return lambda: node.process(request)
+
+@benchmark('db.fetchall', rows=[1, 100, 10000])
+def bench_fetchall(env, rows):
+    from core.db import Database
+
+    db = Database()
+    env.patch(db, 'db_path', env.path('bench.sqlite3'))
+    if not os.path.exists(db.db_path):
+        db.execute("CREATE TABLE bench (id INTEGER PRIMARY KEY, name TEXT, email TEXT, score REAL)")
+        db.executemany(
+            "INSERT INTO bench (name, email, score) VALUES (?, ?, ?)",
+            [(f"user {i}", f"user{i}@example.com", i * 0.5) for i in range(10000)],
+        )
+    return lambda: db.fetchall("SELECT * FROM bench LIMIT ?", (rows,))
+
+# --- Runner ---
+
+def measure(case, budget):
+    """Runs one benchmark case; returns per-op timings in microseconds."""
+    if callable(case):
+        case = {'op': case}
+    op, reset, number = case['op'], case.get('reset'), case.get('number')
+
+    def run_loop(count):
+        if reset is not None:
+            reset()
+        started = time.perf_counter()
+        for _ in range(count):
+            op()
+        return time.perf_counter() - started
+
+    if number is None:
+        number = 1
+        while run_loop(number) < MIN_LOOP_TIME:
+            number *= 2
+
+    timings, spent = [], 0.0
+    while len(timings) < MIN_REPEATS or (spent < budget and len(timings) < 1000):
+        elapsed = run_loop(number)
+        spent += elapsed
+        timings.append(elapsed / number * 1e6)
+
+    median = statistics.median(timings)
+    return {
+        'us_per_op': round(median, 4),
+        'min_us': round(min(timings), 4),
+        'stdev_us': round(statistics.stdev(timings), 4),
+        'ops_per_s': round(1e6 / median, 1) if median else None,
+        'number': number,
+        'repeats': len(timings),
+    }
+
+def run_suite(project=None, pattern=None, budget=0.5):
+    """Runs the benchmarks whose name matches pattern (regex). Returns a baseline-shaped dict."""
+    selected = [entry for entry in BENCHMARKS if pattern is None or re.search(pattern, entry[0])]
+    env = Environment(project)
+    results = {}
+    try:
+        for name, params, factory in selected:
+            case = factory(env, **params)
+            results[name] = measure(case, budget)
+            stats = results[name]
+            print(
+                f"{name:<36} {stats['us_per_op']:>12.3f} us/op  min {stats['min_us']:.3f}"
+                f"  (±{stats['stdev_us']:.3f}, {stats['repeats']} x {stats['number']})"
+            )
+    finally:
+        env.close()
+    return {
+        'version': BASELINE_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Prints current vs baseline per benchmark; returns the names that regressed.
+    Compares the fastest repeat (min_us), which is the least disturbed by other work on
+    the machine. A change counts only if it exceeds both threshold and the spread of the
+    two runs (their stdev_us summed); smaller changes are reported as noise.
+    """
+    regressions = []
+    print(f"\n{'benchmark (min us/op)':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:<36} {'-':>12} {stats['min_us']:>12.3f}      new")
+            continue
+        delta = stats['min_us'] - base['min_us']
+        change = delta / base['min_us'] if base['min_us'] else 0.0
+        spread = base['stdev_us'] + stats['stdev_us']
+        flag = ''
+        if abs(change) > threshold:
+            if abs(delta) <= spread:
+                flag = '  (within noise)'
+            elif change > 0:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            else:
+                flag = '  faster'
+        print(f"{name:<36} {base['min_us']:>12.3f} {stats['min_us']:>12.3f} {change:>+8.1%}{flag}")
+    if baseline.get('python') != current['python']:
+        print(f"Note: baseline was recorded on Python {baseline.get('python')}, this run is {current['python']}.")
+    return regressions
+
+def run_microbench(project=None, pattern=None, budget=0.5, save=None, baseline=None, threshold=DEFAULT_THRESHOLD):
+    """Entry point of `node-web microbench`. Returns the process exit code."""
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            baseline_data = json.load(f)
+        if baseline_data.get('version') != BASELINE_VERSION:
+            raise ValueError(f"Unsupported baseline version in {baseline}")
+
+    current = run_suite(project, pattern, budget)
+
+    if save:
+        with open(save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {save}")
+
+    if baseline:
+        regressions = compare(current, baseline_data, threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {threshold:.0%} and their noise: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo regressions beyond {threshold:.0%}.")
+    return 0